@@ -0,0 +1,332 @@
+"""Benchmarks for AddressBook and Record hot paths, results are printed as JSON"""
+
+from datetime import date, datetime
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from task_01 import (
+    ENGINES, AddressBook, Checkpointer, Record, SQLiteAddressBook, dispatch, load_data, parse_date, save_data, show_all,
+)
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+# Per-operation benchmarks sample this many calls, memory is traced over a smaller sample
+DEFAULT_OPS = 10_000
+MEMORY_SAMPLE_OPS = 1_000
+DEFAULT_REPEAT = 3
+DEFAULT_THREADS = 8
+# Contacts shared by stress threads, few enough for threads to keep hitting the same records
+STRESS_CONTACTS = 500
+STRESS_CHECKPOINT_INTERVAL = 0.05
+# Window covering every day of a leap year once, so each birthday is listed exactly once
+FULL_YEAR = (date(2024, 1, 1), 365)
+FIRST_BIRTHDAY = date(1950, 1, 1).toordinal()
+LAST_BIRTHDAY = date(2010, 12, 31).toordinal()
+
+
+def generate_records(contacts: int, phones_per_contact: int, birthday_density: float, seed: int):
+    """Yield synthetic records with unique names and phones"""
+
+    rng = random.Random(seed)
+    for i in range(contacts):
+        record = Record(f"Contact{i:07d}")
+        for j in range(phones_per_contact):
+            record.add_phone(f"{(i * phones_per_contact + j) * 7 % 10 ** 10:010d}")
+        if rng.random() < birthday_density:
+            birthday = date.fromordinal(rng.randint(FIRST_BIRTHDAY, LAST_BIRTHDAY))
+            record.add_birthday(birthday.strftime("%d.%m.%Y"))
+        yield record
+
+
+def percentile(sorted_values, fraction: float):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def time_calls(calls) -> list[int]:
+    """Run zero-argument callables and return the latency of each one in nanoseconds"""
+
+    latencies = []
+    clock = time.perf_counter_ns
+    for call in calls:
+        start = clock()
+        call()
+        latencies.append(clock() - start)
+    return latencies
+
+
+def peak_memory(calls) -> int:
+    tracemalloc.start()
+    try:
+        for call in calls:
+            call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(name: str, contacts: int, latencies: list[int], memory: int) -> dict:
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "benchmark": name,
+        "contacts": contacts,
+        "ops": len(latencies),
+        "throughput_ops_per_s": len(latencies) / (total / 1e9) if total else None,
+        "latency_ns": {
+            "mean": total / len(latencies),
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1],
+        },
+        "peak_memory_bytes": memory,
+    }
+
+
+def bench_scale(contacts: int, args, workdir: str) -> list[dict]:
+    """Run every benchmark against one book size"""
+
+    rng = random.Random(args.seed)
+    results = []
+    records = list(generate_records(contacts, args.phones, args.birthday_density, args.seed))
+    names = [record.name.value for record in records]
+    ops = min(args.ops, contacts)
+
+    def add_calls(book, sample):
+        return [lambda record=record: book.add_record(record) for record in sample]
+
+    memory = peak_memory(add_calls(AddressBook(), records[:MEMORY_SAMPLE_OPS]))
+    book = AddressBook()
+    results.append(summarize("add_record", contacts, time_calls(add_calls(book, records)), memory))
+
+    def find_calls(count):
+        return [lambda name=rng.choice(names): book.find(name) for _ in range(count)]
+
+    memory = peak_memory(find_calls(MEMORY_SAMPLE_OPS))
+    results.append(summarize("find", contacts, time_calls(find_calls(ops)), memory))
+
+    if args.phones:
+        def find_phone_calls(count):
+            calls = []
+            for _ in range(count):
+                record = rng.choice(records)
+                calls.append(lambda record=record, phone=rng.choice(record.phones).value: record.find_phone(phone))
+            return calls
+
+        memory = peak_memory(find_phone_calls(MEMORY_SAMPLE_OPS))
+        results.append(summarize("find_phone", contacts, time_calls(find_phone_calls(ops)), memory))
+
+        # Each call moves a phone to a fresh number and the next call on that record moves it back
+        def edit_phone_calls(count):
+            calls = []
+            for i in range(count):
+                record = records[i % len(records)]
+                current = record.phones[0].value
+                fresh = f"{10 ** 10 - 1 - i:010d}"
+                calls.append(lambda record=record, current=current, fresh=fresh: record.edit_phone(current, fresh))
+                calls.append(lambda record=record, current=current, fresh=fresh: record.edit_phone(fresh, current))
+            return calls
+
+        memory = peak_memory(edit_phone_calls(MEMORY_SAMPLE_OPS // 2))
+        results.append(summarize("edit_phone", contacts, time_calls(edit_phone_calls(ops // 2)), memory))
+
+    bulk = {
+        "get_upcoming_birthdays": book.get_upcoming_birthdays,
+        "show_all": lambda: show_all([], book),
+    }
+    filename = os.path.join(workdir, f"book-{contacts}.pkl")
+    bulk["save_data"] = lambda: save_data(book, filename, force=True)
+    bulk["load_data"] = lambda: load_data(filename)
+    for name, call in bulk.items():
+        memory = peak_memory([call])
+        results.append(summarize(name, contacts, time_calls([call] * args.repeat), memory))
+
+    return results
+
+
+def bench_birthday_parsing(args) -> list[dict]:
+    """Compare the DD.MM.YYYY fast parser with datetime.strptime on the same dates"""
+
+    rng = random.Random(args.seed)
+    values = [date.fromordinal(rng.randint(FIRST_BIRTHDAY, LAST_BIRTHDAY)).strftime("%d.%m.%Y")
+              for _ in range(args.ops)]
+    parsers = {
+        "parse_date": parse_date,
+        "strptime": lambda value: datetime.strptime(value, "%d.%m.%Y").date(),
+    }
+    results = []
+    for name, parse in parsers.items():
+        def calls(sample, parse=parse):
+            return [lambda value=value: parse(value) for value in sample]
+
+        memory = peak_memory(calls(values[:MEMORY_SAMPLE_OPS]))
+        results.append(summarize(f"birthday_{name}", None, time_calls(calls(values)), memory))
+    return results
+
+
+def stress_command(rng, thread: int, i: int, threads: int, book) -> list[str]:
+    """Pick a random command, phones written by a thread are unique to it"""
+
+    name = f"Contact{rng.randrange(STRESS_CONTACTS):04d}"
+    roll = rng.random()
+    if roll < 0.25:
+        return ["add", name, f"{thread:02d}{i:08d}"]
+    if roll < 0.35:
+        birthday = date.fromordinal(rng.randint(FIRST_BIRTHDAY, LAST_BIRTHDAY))
+        return ["add-birthday", name, birthday.strftime("%d.%m.%Y")]
+    if roll < 0.45:
+        with book.locked():
+            record = book.find(name)
+            phones = record.phones if record is not None else []
+        current = phones[0].value if phones else "0000000000"
+        return ["change", name, current, f"{thread + 50:02d}{i:08d}"]
+    if roll < 0.7:
+        return ["phone", name]
+    if roll < 0.8:
+        return ["phone-owner", f"{rng.randrange(threads):02d}{rng.randrange(i + 1):08d}"]
+    if roll < 0.9:
+        return ["show-birthday", name]
+    return ["birthdays", "30"]
+
+
+def check_invariants(book) -> list[str]:
+    """Compare the phone and birthday indexes of a book with its records"""
+
+    errors = []
+    records = list(book.values())
+    if len(records) != len(book):
+        errors.append(f"{len(records)} records but len() is {len(book)}")
+    for record in records:
+        name = record.name.value
+        if book.find(name) is None:
+            errors.append(f"{name} cannot be found")
+        for phone in record.phones:
+            if name not in [owner.name.value for owner in book.find_by_phone(phone.value)]:
+                errors.append(f"{phone.value} of {name} is missing from the phone index")
+    with_birthday = sum(1 for record in records if record.birthday)
+    listed = len(book.get_upcoming_birthdays(*FULL_YEAR))
+    if listed != with_birthday:
+        errors.append(f"{with_birthday} birthdays but {listed} listed over a year")
+    return errors
+
+
+def stress_locking(engine: str, args, workdir: str) -> dict:
+    """Run commands from many threads on one thread-safe book, pickled books are checkpointed meanwhile"""
+
+    checkpointer = None
+    if engine == "sqlite":
+        book = SQLiteAddressBook(os.path.join(workdir, "stress.db"))
+    else:
+        filename = os.path.join(workdir, f"stress-{engine}.pkl")
+        book = ENGINES[engine]()
+        checkpointer = Checkpointer(book, filename, STRESS_CHECKPOINT_INTERVAL).start()
+    book.use_locking()
+    latencies: list[list[int]] = [[] for _ in range(args.threads)]
+    errors = []
+
+    def worker(thread: int):
+        rng = random.Random(args.seed + thread)
+        clock = time.perf_counter_ns
+        try:
+            for i in range(args.ops):
+                command, *command_args = stress_command(rng, thread, i, args.threads, book)
+                start = clock()
+                dispatch(command, command_args, book)
+                latencies[thread].append(clock() - start)
+        except Exception as e:
+            errors.append(f"thread {thread} failed: {e!r}")
+
+    workers = [threading.Thread(target=worker, args=(thread,)) for thread in range(args.threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    # The checkpointer still runs, and saving a columnar book compacts its columns
+    with book.locked():
+        errors.extend(check_invariants(book))
+    if checkpointer is not None:
+        checkpointer.stop()
+        if checkpointer.last_error is not None:
+            errors.append(f"checkpoint failed: {checkpointer.last_error}")
+        save_data(book, filename)
+        if sorted(load_data(filename)) != sorted(book):
+            errors.append("reloaded snapshot differs from the book")
+    contacts = len(book)
+    if engine == "sqlite":
+        book.close()
+
+    result = summarize(f"stress_{engine}", contacts, [latency for thread in latencies for latency in thread], None)
+    result["threads"] = args.threads
+    result["checkpoints"] = checkpointer.checkpoints if checkpointer is not None else None
+    result["invariant_errors"] = errors
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AddressBook hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of contacts")
+    parser.add_argument("--phones", type=int, default=2, help="phones per contact")
+    parser.add_argument("--birthday-density", type=float, default=0.8, help="share of contacts with birthday")
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS, help="calls per single-record benchmark")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per full-book benchmark")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="threads of the locking stress test")
+    parser.add_argument("--stress-only", action="store_true", help="only run the locking stress test")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "phones_per_contact": args.phones,
+            "birthday_density": args.birthday_density,
+            "ops": args.ops,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "threads": args.threads,
+            "stress_only": args.stress_only,
+        },
+        "results": [] if args.stress_only else bench_birthday_parsing(args),
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for engine in (*ENGINES, "sqlite"):
+            report["results"].append(stress_locking(engine, args, workdir))
+        if not args.stress_only:
+            for contacts in args.sizes:
+                report["results"].extend(bench_scale(contacts, args, workdir))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    # Broken invariants under concurrency fail the run, timings alone never do
+    if any(result.get("invariant_errors") for result in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,163 +1,2482 @@
-from collections import UserDict
-from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, UserDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import argparse
+import asyncio
+import calendar
+import csv
+import gc
+import hashlib
+import heapq
+import json
+import mmap
+import os
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
 import pickle
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import warnings
+import weakref
+import zlib
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Field:
     """Base class for fields"""
 
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
     def __str__(self):
         return str(self.value)
 
+    # Same state as the former __dict__ based fields, so old and new pickles load both ways
+    def __getstate__(self):
+        return {'value': self.value}
+
+    def __setstate__(self, state):
+        self.value = state['value']
+
 
 class Name(Field):
     """Class to store a contact name. Required field"""
 
+    __slots__ = ()
+
     def __init__(self, value: str):
         if not isinstance(value, str) or not value.strip():
             raise ValueError("Name cannot be empty or contain only spaces")
         super().__init__(value.strip())
 
 
+# Key under which spellings differing only in case or Unicode form meet: "ALICE", "alice" and "ａｌｉｃｅ"
+def normalize_name(name: str) -> str:
+    return unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", name.strip()).casefold())
+
+
 class Phone(Field):
     """Class to store phone numbers"""
 
+    __slots__ = ()
+
     def __init__(self, value: str):
         if not isinstance(value, str) or not value.isdigit() or len(value) != 10:
             raise ValueError("Phone number must contain 10 digits.")
         super().__init__(value)
 
 
+# Day and month spellings accepted by the %d and %m directives of strptime
+STRPTIME_DAYS = frozenset(
+    [str(day) for day in range(1, 10)] + [f" {day}" for day in range(1, 10)] + [f"{day:02d}" for day in range(1, 32)]
+)
+STRPTIME_MONTHS = frozenset([str(month) for month in range(1, 10)] + [f"{month:02d}" for month in range(1, 13)])
+
+
+def parse_date(value: str) -> date:
+    """Parse a date the same way as datetime.strptime(value, '%d.%m.%Y'), without its regex machinery"""
+
+    if not isinstance(value, str):
+        raise TypeError(f"strptime() argument 1 must be str, not {type(value).__name__}")
+    parts = value.split('.')
+    if len(parts) != 3:
+        raise ValueError(f"time data {value!r} does not match format '%d.%m.%Y'")
+    day, month, year = parts
+    # strptime's \d also matches non-ASCII decimal digits as the second digit of days 10-29 and in years
+    day_ok = day in STRPTIME_DAYS or (len(day) == 2 and day[0] in "12" and day[1].isdecimal())
+    if not day_ok or month not in STRPTIME_MONTHS or len(year) != 4 or not year.isdecimal():
+        raise ValueError(f"time data {value!r} does not match format '%d.%m.%Y'")
+    return date(int(year), int(month), int(day))
+
+
 class Birthday(Field):
     """Class to store birthday"""
+
+    __slots__ = ()
+
     def __init__(self, value: str):
         try:
-            date = datetime.strptime(value, '%d.%m.%Y').date()
+            date = parse_date(value)
         except ValueError:
             raise ValueError("Invalid date format. Use DD.MM.YYYY")
         super().__init__(date)
 
+    # Build from an already valid date without parsing a string
+    @classmethod
+    def from_date(cls, value):
+        birthday = cls.__new__(cls)
+        Field.__init__(birthday, value)
+        return birthday
+
     def date_to_string(self):
         return self.value.strftime('%d.%m.%Y')
 
 
+# Days before each month in a leap year, maps (month, day) to one of 366 calendar slots
+MONTH_OFFSETS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+
+
+def day_slot(month: int, day: int) -> int:
+    return MONTH_OFFSETS[month - 1] + day - 1
+
+
+FEB_29_SLOT = day_slot(2, 29)
+
+
+# Phone count above which a record looks numbers up through a dict instead of scanning its list
+PHONE_INDEX_MIN_SIZE = 8
+
+
+class PhoneIndex:
+    """Insertion-ordered set of Phone objects with constant-time lookup by number
+
+    Few phones are kept in an exactly sized tuple, which is smaller than a list or dict and just as fast to scan.
+    Past PHONE_INDEX_MIN_SIZE they move to an order dict keyed by the Phone object itself, which an edit leaves
+    in place, and a dict from number to Phone.
+    """
+
+    __slots__ = ('_items', '_by_number')
+
+    def __init__(self, phones=()):
+        self._items: tuple[Phone, ...] | dict[Phone, None] = ()
+        self._by_number: dict[str, Phone] | None = None
+        for phone in phones:
+            self.add(phone)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, phone_number):
+        return self.get(phone_number) is not None
+
+    # Phone numbers as strings in insertion order
+    def numbers(self):
+        return (phone.value for phone in self._items)
+
+    # Return Phone object by its number or None
+    def get(self, phone_number: str):
+        if self._by_number is not None:
+            return self._by_number.get(phone_number)
+        return next((phone for phone in self._items if phone.value == phone_number), None)
+
+    def add(self, phone: Phone):
+        if self._by_number is not None:
+            self._items[phone] = None
+            self._by_number[phone.value] = phone
+            return
+        items = self._items + (phone,)
+        if len(items) > PHONE_INDEX_MIN_SIZE:
+            self._items = dict.fromkeys(items)
+            self._by_number = {item.value: item for item in items}
+        else:
+            self._items = items
+
+    def remove(self, phone: Phone):
+        if self._by_number is not None:
+            del self._items[phone]
+            del self._by_number[phone.value]
+        else:
+            self._items = tuple(item for item in self._items if item is not phone)
+
+    # Change number in place, the order dict is keyed by the phone so it keeps its position
+    def replace(self, phone: Phone, new_number: str):
+        if self._by_number is not None:
+            del self._by_number[phone.value]
+            self._by_number[new_number] = phone
+        phone.value = new_number
+
+
+class CompactPhones:
+    """Validated phone numbers packed as 64-bit integers, same API as PhoneIndex
+
+    A number costs 8 bytes instead of about 100 for a Phone and its string, on top of the array's own 80 bytes,
+    so two phones take 152 bytes instead of 318. Books key their reverse index by int in this mode.
+    """
+
+    __slots__ = ('_numbers', '_lookup')
+
+    def __init__(self, phones=()):
+        self._set_numbers(array('q', (int(phone.value) for phone in phones)))
+
+    # Past PHONE_INDEX_MIN_SIZE a set answers membership, a scan of the array compares boxed ints
+    def _set_numbers(self, numbers: array):
+        self._numbers = numbers
+        self._lookup: set[int] | None = set(numbers) if len(numbers) > PHONE_INDEX_MIN_SIZE else None
+
+    # Same state as before the lookup set existed, so old and new pickles load both ways
+    def __getstate__(self):
+        return None, {'_numbers': self._numbers}
+
+    def __setstate__(self, state):
+        self._set_numbers(state[1]['_numbers'])
+
+    def __len__(self):
+        return len(self._numbers)
+
+    # Phones are rebuilt on the fly and are not tied to the stored numbers
+    def __iter__(self):
+        return (self._phone(number) for number in self._numbers)
+
+    def __contains__(self, phone_number):
+        return self._position(phone_number) >= 0
+
+    def numbers(self):
+        return (f"{number:010d}" for number in self._numbers)
+
+    @staticmethod
+    def _phone(number: int) -> Phone:
+        phone = Phone.__new__(Phone)
+        phone.value = f"{number:010d}"
+        return phone
+
+    # Linear scan over the packed array, only for numbers known to be there once the lookup set exists
+    def _position(self, phone_number) -> int:
+        if not isinstance(phone_number, str) or len(phone_number) != 10 or not phone_number.isdigit():
+            return -1
+        number = int(phone_number)
+        if self._lookup is not None and number not in self._lookup:
+            return -1
+        try:
+            return self._numbers.index(number)
+        except ValueError:
+            return -1
+
+    def get(self, phone_number: str):
+        position = self._position(phone_number)
+        return self._phone(self._numbers[position]) if position >= 0 else None
+
+    def add(self, phone: Phone):
+        number = int(phone.value)
+        self._numbers.append(number)
+        if self._lookup is not None:
+            self._lookup.add(number)
+        elif len(self._numbers) > PHONE_INDEX_MIN_SIZE:
+            self._lookup = set(self._numbers)
+
+    def remove(self, phone: Phone):
+        del self._numbers[self._position(phone.value)]
+        if self._lookup is not None:
+            self._lookup.discard(int(phone.value))
+
+    def replace(self, phone: Phone, new_number: str):
+        self._numbers[self._position(phone.value)] = int(new_number)
+        if self._lookup is not None:
+            self._lookup.discard(int(phone.value))
+            self._lookup.add(int(new_number))
+        phone.value = new_number
+
+
 class Record:
     """Class to store contact data (name, phone numbers and birthday optionally)"""
 
-    def __init__(self, name: str):
+    __slots__ = ('name', '_phones', 'birthday', '_book', '__weakref__')
+
+    def __init__(self, name: str, compact_phones: bool = False):
         self.name = Name(name)
-        self.phones: list[Phone] = []
+        self._phones = CompactPhones() if compact_phones else PhoneIndex()
         self.birthday: Birthday | None = None
+        self._book: "AddressBook | None" = None
+
+    @property
+    def phones(self) -> list[Phone]:
+        return list(self._phones)
+
+    @property
+    def compact_phones(self) -> bool:
+        return isinstance(self._phones, CompactPhones)
+
+    # Switch phone storage to packed integers, trading the per-number index for memory
+    def use_compact_phones(self):
+        if not self.compact_phones:
+            self._phones = CompactPhones(self._phones)
 
     # Add phone number to a contact
     def add_phone(self, phone_number: str):
-        if self.find_phone(phone_number):
+        with self._locked():
+            self._add_phone(phone_number)
+
+    def _add_phone(self, phone_number: str):
+        if phone_number in self._phones:
             raise ValueError("Phone number already in use. Enter a new phone number.")
-        self.phones.append(Phone(phone_number))
+        phone = Phone(phone_number)
+        self._changing()
+        self._phones.add(phone)
+        if self._book is not None:
+            self._book._phone_added(self, phone_number)
 
     # Delete contact's phone number if it exists
     def remove_phone(self, phone_number: str):
+        with self._locked():
+            return self._remove_phone(phone_number)
+
+    def _remove_phone(self, phone_number: str):
         phone = self.find_phone(phone_number)
         if phone:
-            self.phones.remove(phone)
+            self._changing()
+            self._phones.remove(phone)
+            if self._book is not None:
+                self._book._phone_removed(self, phone_number)
             return True
         return False
 
     # Edit contact phone number
     def edit_phone(self, current_number: str, new_number: str):
+        with self._locked():
+            return self._edit_phone(current_number, new_number)
+
+    def _edit_phone(self, current_number: str, new_number: str):
         phone = self.find_phone(current_number)
         if not phone:
             raise ValueError("Phone number not found.")
-        if self.find_phone(new_number):
+        if new_number in self._phones:
             raise ValueError("Phone number already in use. Enter a new phone number.")
 
-        phone.value = Phone(new_number).value
+        new_number = Phone(new_number).value
+        self._changing()
+        self._phones.replace(phone, new_number)
+        if self._book is not None:
+            self._book._phone_edited(self, current_number, new_number)
 
         return True
 
+    # Write lock of the book sharing the record between threads
+    def _locked(self):
+        book = self._book
+        return book.locked(write=True) if book is not None and book.lock is not None else nullcontext()
+
+    # Called before the record changes, so the book can keep its current state for a running checkpoint
+    def _changing(self):
+        if self._book is not None:
+            self._book._record_changing(self)
+
     # Find contact phone number
     def find_phone(self, phone_number: str):
-        return next((phone for phone in self.phones if phone.value == phone_number), None)
+        return self._phones.get(phone_number)
 
     # Add contact birthday
     def add_birthday(self, date_str: str):
         bday = Birthday(date_str)
-        self.birthday = bday
+        with self._locked():
+            self._changing()
+            previous, self.birthday = self.birthday, bday
+            if self._book is not None:
+                self._book._birthday_changed(self, previous)
         return True
 
     def birthday_to_string(self):
         return self.birthday.date_to_string() if self.birthday else None
 
+    # Immutable copy of (name, phone numbers, birthday ordinal or 0), safe to read while the record changes
+    def to_tuple(self) -> tuple[str, tuple[str, ...], int]:
+        return self.name.value, tuple(self._phones.numbers()), self.birthday.value.toordinal() if self.birthday else 0
+
+    @classmethod
+    def from_tuple(cls, data: tuple, compact_phones: bool = False):
+        name, numbers, birthday = data
+        record = cls(name)
+        phones = [Phone(number) for number in numbers]
+        record._phones = CompactPhones(phones) if compact_phones else PhoneIndex(phones)
+        if birthday:
+            record.birthday = Birthday.from_date(date.fromordinal(birthday))
+        return record
+
+    # Plain data for JSON, read from the fields rather than the text of __str__
+    def to_dict(self) -> dict:
+        return {'name': self.name.value, 'phones': list(self._phones.numbers()), 'birthday': self.birthday_to_string()}
+
+    # Build from decoded JSON, every malformed shape is a ValueError with a message for the client
+    @classmethod
+    def from_dict(cls, data: dict):
+        if not isinstance(data, dict):
+            raise ValueError("Contact must be a JSON object")
+        if 'name' not in data:
+            raise ValueError("Missing field name.")
+        phones, birthday = data.get('phones') or [], data.get('birthday')
+        if not isinstance(phones, list) or not all(isinstance(phone, str) for phone in phones):
+            raise ValueError("Field phones must be a list of strings")
+        if birthday is not None and not isinstance(birthday, str):
+            raise ValueError("Field birthday must be a string DD.MM.YYYY or null")
+        record = cls(data['name'])
+        for phone in phones:
+            record.add_phone(phone)
+        if birthday:
+            record.add_birthday(birthday)
+        return record
+
     def __str__(self):
-        phones = '; '.join(phone.value for phone in self.phones) if self.phones else '-'
+        phones = '; '.join(self._phones.numbers()) if self._phones else '-'
         bday = self.birthday.date_to_string() if self.birthday else '-'
         return f'Contact name: {self.name.value}, phones: {phones}, birthday: {bday}'
 
+    # Pickle phones as a plain list so snapshots stay independent of the index, packed phones as is
+    def __getstate__(self):
+        phones = self._phones if self.compact_phones else list(self._phones)
+        return {'name': self.name, 'phones': phones, 'birthday': self.birthday}
+
+    def __setstate__(self, state):
+        self.name = state['name']
+        phones = state.get('phones', ())
+        self._phones = phones if isinstance(phones, CompactPhones) else PhoneIndex(phones)
+        self.birthday = state.get('birthday')
+        self._book = None
+
+
+UPCOMING_BIRTHDAYS_DAYS = 7
+SEARCH_PAGE_SIZE = 20
+FUZZY_LIMIT = 5
+# Lowest trigram similarity (Dice coefficient) of a fuzzy match
+FUZZY_MIN_SIMILARITY = 0.3
+CSV_HEADER = ("name", "phones", "birthday")
+CSV_PHONE_SEPARATOR = ";"
+CSV_BATCH_SIZE = 1000
+
+
+# Smallest string above every string starting with prefix, None when no such string exists
+def prefix_end(prefix: str) -> str | None:
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+# Search order of names: normalized, so a prefix in any case or Unicode form finds them, then as spelled
+def name_order(name: str) -> tuple[str, str]:
+    return normalize_name(name), name
+
+
+class SortedNames:
+    """Contact names in name_order, kept in blocks so an insert shifts one block instead of the whole list"""
+
+    BLOCK_SIZE = 1024
+
+    __slots__ = ('_blocks', '_maxes', '_len')
+
+    def __init__(self, names=()):
+        names = sorted(names, key=name_order)
+        self._blocks = [names[i:i + self.BLOCK_SIZE] for i in range(0, len(names), self.BLOCK_SIZE)]
+        # Order key of the last name of every block, bisected to find the block of a name
+        self._maxes = [name_order(block[-1]) for block in self._blocks]
+        self._len = len(names)
+
+    def __len__(self):
+        return self._len
+
+    def sizeof(self) -> int:
+        return (sys.getsizeof(self._blocks) + sys.getsizeof(self._maxes)
+                + sum(sys.getsizeof(block) for block in self._blocks))
+
+    def add(self, name: str):
+        key = name_order(name)
+        if not self._blocks:
+            self._blocks.append([name])
+            self._maxes.append(key)
+            self._len = 1
+            return
+        index = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        block = self._blocks[index]
+        position = bisect_left(block, key, key=name_order)
+        if position < len(block) and block[position] == name:
+            return
+        block.insert(position, name)
+        self._maxes[index] = name_order(block[-1])
+        self._len += 1
+        if len(block) > 2 * self.BLOCK_SIZE:
+            self._blocks[index:index + 1] = [block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]]
+            self._maxes[index:index + 1] = [name_order(block[self.BLOCK_SIZE - 1]), self._maxes[index]]
+
+    def remove(self, name: str):
+        key = name_order(name)
+        index = bisect_left(self._maxes, key)
+        if index == len(self._maxes):
+            return
+        block = self._blocks[index]
+        position = bisect_left(block, key, key=name_order)
+        if block[position] != name:
+            return
+        del block[position]
+        self._len -= 1
+        if block:
+            self._maxes[index] = name_order(block[-1])
+        else:
+            del self._blocks[index]
+            del self._maxes[index]
+
+    # Number of names sorting before the order key
+    def _rank(self, key: tuple[str, str]) -> int:
+        index = bisect_left(self._maxes, key)
+        rank = sum(len(block) for block in self._blocks[:index])
+        if index < len(self._blocks):
+            rank += bisect_left(self._blocks[index], key, key=name_order)
+        return rank
+
+    # Start and end ranks of the names whose normalized form starts with the normalized prefix
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        prefix = normalize_name(prefix)
+        end = prefix_end(prefix)
+        return self._rank((prefix, "")), self._len if end is None else self._rank((end, ""))
+
+    # Names with ranks from start up to stop
+    def slice(self, start: int, stop: int) -> list[str]:
+        names = []
+        for block in self._blocks:
+            if stop <= 0:
+                break
+            if start < len(block):
+                names.extend(block[max(start, 0):stop])
+            start -= len(block)
+            stop -= len(block)
+        return names
+
+
+class NameKeys:
+    """Normalized name -> stored spelling, for lookups in any case or Unicode form"""
+
+    __slots__ = ('_names', '_shared')
+
+    def __init__(self, names=()):
+        self._names: dict[str, str] = {}
+        # Later spellings of a key already taken, only books created before names were normalized have any
+        self._shared: dict[str, list[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def sizeof(self) -> int:
+        return sys.getsizeof(self._names) + sys.getsizeof(self._shared)
+
+    def get(self, name: str) -> str | None:
+        return self._names.get(normalize_name(name))
+
+    def add(self, name: str):
+        key = normalize_name(name)
+        if self._names.setdefault(key, name) != name:
+            self._shared.setdefault(key, []).append(name)
+
+    # The oldest remaining spelling takes over the key
+    def remove(self, name: str):
+        key = normalize_name(name)
+        shared = self._shared.get(key)
+        if self._names.get(key) == name:
+            if shared:
+                self._names[key] = shared.pop(0)
+            else:
+                del self._names[key]
+        elif shared and name in shared:
+            shared.remove(name)
+        if shared is not None and not shared:
+            del self._shared[key]
+
+
+# Trigrams of a normalized name padded like pg_trgm, so short names and name starts weigh more
+def trigrams(name: str) -> set[str]:
+    padded = f"  {normalize_name(name)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from name trigrams to names, for lookups that tolerate typos"""
+
+    __slots__ = ('_postings',)
+
+    def __init__(self, names=()):
+        self._postings: dict[str, set[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def sizeof(self) -> int:
+        return sys.getsizeof(self._postings) + sum(sys.getsizeof(names) for names in self._postings.values())
+
+    def add(self, name: str):
+        for gram in trigrams(name):
+            self._postings.setdefault(gram, set()).add(name)
+
+    def remove(self, name: str):
+        for gram in trigrams(name):
+            names = self._postings.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._postings[gram]
+
+    # Up to limit (similarity, name) pairs, most similar first. Only names sharing a trigram with the query are
+    # counted, and names are scored from the most shared trigrams down until no remaining name can make the list
+    def closest(self, query: str, limit: int = FUZZY_LIMIT,
+                min_similarity: float = FUZZY_MIN_SIMILARITY) -> list[tuple[float, str]]:
+        wanted = trigrams(query)
+        shared = Counter()
+        for gram in wanted:
+            shared.update(self._postings.get(gram, ()))
+        by_count: dict[int, list[str]] = {}
+        for name, count in shared.items():
+            by_count.setdefault(count, []).append(name)
+
+        best: list[tuple[float, str]] = []
+        for count in sorted(by_count, reverse=True):
+            # Dice similarity 2c / (|query| + |name|) is at most this, as a name has at least c trigrams
+            bound = 2 * count / (len(wanted) + count)
+            if bound < min_similarity or (len(best) == limit and bound <= best[0][0]):
+                break
+            for name in by_count[count]:
+                similarity = 2 * count / (len(wanted) + len(trigrams(name)))
+                if similarity < min_similarity:
+                    continue
+                if len(best) < limit:
+                    heapq.heappush(best, (similarity, name))
+                elif (similarity, name) > best[0]:
+                    heapq.heapreplace(best, (similarity, name))
+        return sorted(best, reverse=True)
+
+
+class RWLock:
+    """Reader-writer lock: many readers or one writer, waiting writers hold back new readers.
+    The writer may take the lock again and read under it, readers may nest reads but not upgrade"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writer: int | None = None
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        reads = getattr(self._local, "reads", 0)
+        if not reads:
+            with self._cond:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.reads = reads + 1
+        try:
+            yield
+        finally:
+            self._local.reads = reads
+            if not reads:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        if getattr(self._local, "reads", 0):
+            raise RuntimeError("Cannot take the write lock while holding the read lock")
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def synchronized(write: bool = False):
+    """Run a book method under the lock of the thread-safe mode, see BaseAddressBook.use_locking"""
+
+    def decorator(method):
+        @wraps(method)
+        def inner(self, *args, **kwargs):
+            if self.lock is None:
+                return method(self, *args, **kwargs)
+            with self.locked(write):
+                return method(self, *args, **kwargs)
+        return inner
+    return decorator
+
+
+class BaseAddressBook(ABC):
+    """Storage-independent AddressBook queries built on top of find, add_record, values and _birthdays_in"""
+
+    journal = None
+    checkpointer = None
+    # Reader-writer lock of the thread-safe mode, None while the book is used from one thread
+    lock: RWLock | None = None
+    # Whether readers may share the lock, engines that change state on reads take it exclusively
+    concurrent_reads = True
+    # Sequence number of the last change, stored in snapshots to skip replayed journal entries
+    _lsn = 0
+    # Sequence number covered by the snapshot on disk, None when the snapshot layout is outdated
+    _saved_lsn: int | None = 0
+
+    # Changed since it was loaded or last saved
+    @property
+    def dirty(self) -> bool:
+        return self._lsn != self._saved_lsn
+
+    # Force the next save, for changes that are not journaled such as a new storage layout
+    def mark_dirty(self):
+        self._saved_lsn = None
+
+    def mark_saved(self):
+        self._saved_lsn = self._lsn
+
+    # Held while write_snapshot moves the snapshot files of the book to their next generation
+    @contextmanager
+    def _snapshot_released(self, filename: str):
+        yield
+
+    # Share the book between threads: every method of the book and its records takes the lock by itself.
+    # Hold book.locked() to make several calls atomic or to iterate the book
+    def use_locking(self):
+        if self.lock is None:
+            self.lock = RWLock()
+        return self
+
+    # Hold the lock for reading or writing in the thread-safe mode, do nothing otherwise
+    @contextmanager
+    def locked(self, write: bool = False):
+        if self.lock is None:
+            yield
+        elif write or not self.concurrent_reads:
+            with self.lock.write():
+                yield
+        else:
+            with self.lock.read():
+                yield
+
+    # Group many changes into one unit of persistence, journal entries are written at once
+    @contextmanager
+    def batch(self):
+        if self.journal is None:
+            yield
+            return
+        with self.journal.buffered():
+            yield
+
+    def _record_change(self, op: str, *args):
+        self._lsn += 1
+        if self.journal is not None:
+            self.journal.append(self._lsn, op, *args)
+
+    # Apply a journaled change without journaling it again
+    def _replay(self, lsn: int, op: str, *args):
+        journal, self.journal = self.journal, None
+        try:
+            if op == 'add_record':
+                name, phones, birthday = args
+                record = Record(name)
+                for phone in phones:
+                    record.add_phone(phone)
+                if birthday:
+                    record.add_birthday(birthday)
+                self.add_record(record)
+            elif op == 'delete':
+                self.delete(*args)
+            else:
+                name, *values = args
+                getattr(self.find(name), op)(*values)
+        finally:
+            self.journal = journal
+        self._lsn = lsn
+
+    # Find a record by contact name, in any case or Unicode form when there is no exact match
+    @abstractmethod
+    def find(self, name: str):
+        pass
+
+    # Add a new record, replacing a stored contact with the same name
+    @abstractmethod
+    def add_record(self, record: Record):
+        pass
+
+    # Delete a record by contact name, True when there was one
+    @abstractmethod
+    def delete(self, name: str) -> bool:
+        pass
+
+    # Function writing the current state as a snapshot. Called under the write lock, it copies what the
+    # snapshot needs so the returned function can run without the lock while the book keeps changing
+    @abstractmethod
+    def _snapshot_writer(self):
+        pass
+
+    # Called by a record of this book before it changes
+    def _record_changing(self, record: Record):
+        pass
+
+    # Bytes held by in-memory indexes, not counting the records themselves
+    def index_sizeof(self) -> int:
+        return 0
+
+    # (day, record) pairs for the given days, in day order
+    @abstractmethod
+    def _birthdays_in(self, days):
+        pass
+
+    # Name indexes of in-memory engines, None until a lazily loaded book builds them
+    _sorted_names: SortedNames | None = None
+    _name_keys: NameKeys | None = None
+    # Built by the first fuzzy search and kept up to date afterwards
+    _trigrams: TrigramIndex | None = None
+
+    def _name_added(self, name: str):
+        if self._sorted_names is not None:
+            self._sorted_names.add(name)
+        if self._name_keys is not None:
+            self._name_keys.add(name)
+        if self._trigrams is not None:
+            self._trigrams.add(name)
+
+    def _name_removed(self, name: str):
+        if self._sorted_names is not None:
+            self._sorted_names.remove(name)
+        if self._name_keys is not None:
+            self._name_keys.remove(name)
+        if self._trigrams is not None:
+            self._trigrams.remove(name)
+
+    def _all_names(self) -> list[str]:
+        return list(self)
+
+    def _trigram_sizeof(self) -> int:
+        return self._trigrams.sizeof() if self._trigrams is not None else 0
+
+    # Up to limit (similarity, record) pairs with names closest to query, most similar first
+    @synchronized()
+    def fuzzy_find(self, query: str, limit: int = FUZZY_LIMIT) -> list[tuple[float, Record]]:
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(self._all_names())
+        return [(similarity, self.find(name)) for similarity, name in self._trigrams.closest(query, limit)]
+
+    def _name_index(self) -> SortedNames:
+        return self._sorted_names
+
+    # Stored spelling of a name typed in another case or Unicode form
+    def _resolve_name(self, name: str) -> str | None:
+        return self._name_keys.get(name)
+
+    # One page of records whose names start with prefix in name order, and the number of all such records
+    @synchronized()
+    def search(self, prefix: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE) -> tuple[list[Record], int]:
+        names = self._name_index()
+        start, end = names.prefix_range(prefix)
+        first = start + (page - 1) * page_size
+        return [self.find(name) for name in names.slice(first, min(first + page_size, end))], end - start
+
+    # Return a list of contacts having birthdays within `days` days from start (both ends included)
+    @synchronized()
+    def get_upcoming_birthdays(self, start=None, days: int = UPCOMING_BIRTHDAYS_DAYS):
+        if days < 0:
+            raise ValueError("Number of days cannot be negative.")
+        start = start or datetime.today().date()
+        upcoming_birthdays = []
+
+        window = [start + timedelta(days=days_delta) for days_delta in range(days + 1)]
+
+        for birthday_this_year, contact in self._birthdays_in(window):
+            congratulation_date = birthday_this_year
+
+            if congratulation_date.weekday() == 5:
+                congratulation_date += timedelta(days=2)
+            elif congratulation_date.weekday() == 6:
+                congratulation_date += timedelta(days=1)
+
+            upcoming_birthdays.append({
+                "name": contact.name.value,
+                "congratulation_date": congratulation_date.strftime("%d.%m.%Y")
+            })
 
-class AddressBook(UserDict):
+        return upcoming_birthdays
+
+    # Merge contacts from a CSV file (name,phones,birthday), committing every batch_size rows
+    def import_csv(self, filename: str, batch_size: int = CSV_BATCH_SIZE):
+        imported = skipped = 0
+        with open(filename, newline="", encoding="utf-8") as f:
+            rows = iter_csv_rows(f)
+            while chunk := list(islice(rows, batch_size)):
+                # Other threads get the book between batches
+                with self.locked(write=True), self.batch():
+                    for row in chunk:
+                        try:
+                            self._merge_csv_row(*row)
+                        except ValueError:
+                            skipped += 1
+                        else:
+                            imported += 1
+        return imported, skipped
+
+    def _merge_csv_row(self, name: str, phones: str, birthday: str):
+        name = Name(name).value
+        # A number repeated within the row is added once, for new and existing contacts alike
+        phones = dict.fromkeys(
+            Phone(phone.strip()).value for phone in phones.split(CSV_PHONE_SEPARATOR) if phone.strip())
+        birthday = birthday.strip()
+        if birthday:
+            Birthday(birthday)
+
+        record = self.find(name)
+        if record is None:
+            record = Record(name)
+            for phone in phones:
+                record.add_phone(phone)
+            if birthday:
+                record.add_birthday(birthday)
+            self.add_record(record)
+            return
+
+        for phone in phones:
+            if not record.find_phone(phone):
+                record.add_phone(phone)
+        if birthday and record.birthday_to_string() != birthday:
+            record.add_birthday(birthday)
+
+    # Write all contacts to a CSV file row by row, as one consistent state
+    @synchronized()
+    def export_csv(self, filename: str):
+        exported = 0
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            for record in self.values():
+                writer.writerow((
+                    record.name.value,
+                    CSV_PHONE_SEPARATOR.join(record._phones.numbers()),
+                    record.birthday_to_string() or "",
+                ))
+                exported += 1
+        return exported
+
+
+# Yield (name, phones, birthday) rows one at a time, skipping the header and blank lines
+def iter_csv_rows(lines):
+    for row in csv.reader(lines):
+        if not row or tuple(cell.strip().lower() for cell in row) == CSV_HEADER:
+            continue
+        name, phones, birthday = (row + ["", ""])[:3]
+        yield name, phones, birthday
+
+
+# Feb 29 birthdays are celebrated on Mar 1 in common years
+def is_feb_29_substitute(day) -> bool:
+    return day.month == 3 and day.day == 1 and not calendar.isleap(day.year)
+
+
+# Map calendar slots to positions of the days celebrating them, for one-pass range queries
+def slot_positions(days) -> dict[int, list[int]]:
+    positions: dict[int, list[int]] = {}
+    for position, day in enumerate(days):
+        positions.setdefault(day_slot(day.month, day.day), []).append(position)
+        if is_feb_29_substitute(day):
+            positions.setdefault(FEB_29_SLOT, []).append(position)
+    return positions
+
+
+class AddressBook(BaseAddressBook, UserDict):
     """Class to store contact records"""
 
+    # Records listed by a running checkpoint and the old state of those changed since, see _snapshot_writer
+    _checkpoint_records: list[Record] | None = None
+    _changed_records: dict[Record, tuple] | None = None
+
+    def __init__(self, *args, **kwargs):
+        self._sorted_names: SortedNames | None = SortedNames()
+        self._name_keys: NameKeys | None = NameKeys()
+        # A number owned by one record maps to it directly, a shared one to a tuple of owners.
+        # Numbers are keyed as int with compact phones, see _phone_key
+        self._phone_owners: dict[str | int, Record | tuple[Record, ...]] = {}
+        self._birthday_buckets: list[dict[Record, None]] = [{} for _ in range(366)]
+        self._lsn = 0
+        self.journal: Journal | None = None
+        # Store phones of every record in the book as packed integers
+        self.compact_phones = False
+        super().__init__(*args, **kwargs)
+
+    # Keep indexes in sync for every way a record gets in or out of the book
+    def __setitem__(self, name: str, record: Record):
+        if name in self.data:
+            self._record_changing(self.data[name])
+            self._unindex_record(self.data[name])
+        else:
+            self._name_added(name)
+        self.data[name] = record
+        self._index_record(record)
+        self._record_change('add_record', name, list(record._phones.numbers()),
+                            record.birthday_to_string())
+
+    def __delitem__(self, name: str):
+        self._record_changing(self.data[name])
+        self._unindex_record(self.data.pop(name))
+        self._name_removed(name)
+        self._record_change('delete', name)
+
+    # Indexes are rebuilt on load, records are pickled as immutable tuples so a copy taken under the lock
+    # can be pickled without it
+    def __getstate__(self):
+        return {
+            'records': [record.to_tuple() for record in self.data.values()],
+            'lsn': self._lsn, 'compact_phones': self.compact_phones,
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.compact_phones = state.get('compact_phones', False)
+        # Snapshots written before records were pickled as tuples hold Record objects
+        if 'records' in state:
+            records = ((data[0], Record.from_tuple(data, self.compact_phones)) for data in state['records'])
+        else:
+            records = state['data'].items()
+        for name, record in records:
+            self.data[name] = record
+            self._index_record(record)
+        self._sorted_names = SortedNames(self.data)
+        self._name_keys = NameKeys(self.data)
+        self._lsn = state.get('lsn', 0)
+
+    def _snapshot_writer(self):
+        copy_records = self._copy_on_write()
+        cls, lsn, compact_phones = type(self), self._lsn, self.compact_phones
+
+        def write(f):
+            state = {'records': copy_records(), 'lsn': lsn, 'compact_phones': compact_phones}
+            pickle.dump(SnapshotState(cls, state), f)
+        return write
+
+    # Copy on write for checkpoints: the write lock is held only to list the records, the returned function
+    # copies them as tuples in short steps under the lock. A record about to change or leave the book
+    # before its turn has its old state copied first
+    def _copy_on_write(self):
+        records = list(self.data.values())
+        self._checkpoint_records, self._changed_records = records, {}
+
+        def copy_records() -> list[tuple]:
+            frozen = []
+            try:
+                for start in range(0, len(records), SNAPSHOT_COPY_CHUNK):
+                    with self.locked():
+                        changed = self._changed_records
+                        frozen.extend(changed.get(record) or record.to_tuple()
+                                      for record in records[start:start + SNAPSHOT_COPY_CHUNK])
+            finally:
+                with self.locked(write=True):
+                    if self._checkpoint_records is records:
+                        self._checkpoint_records = self._changed_records = None
+            return frozen
+        return copy_records
+
+    def _record_changing(self, record: Record):
+        if self._checkpoint_records is not None and record not in self._changed_records:
+            self._changed_records[record] = record.to_tuple()
+
+    # (name, blob) pairs in book order for a lazy snapshot
+    def _lazy_blobs(self):
+        for name, item in self._lazy_items():
+            yield name, item if isinstance(item, bytes) else encode_lazy_blob(name, item)
+
+    # (name, record or raw blob) pairs in book order
+    def _lazy_items(self):
+        return self.data.items()
+
+    # Pack phones of all current and future records and key the reverse index by int as well.
+    # The flag is part of the snapshot, so the book needs saving
+    @synchronized(write=True)
+    def use_compact_phones(self):
+        if self.compact_phones:
+            return
+        self.mark_dirty()
+        self._pack_phones()
+
+    def _pack_phones(self):
+        self.compact_phones = True
+        for record in self.data.values():
+            record.use_compact_phones()
+        self._phone_owners = {int(number): owners for number, owners in self._phone_owners.items()}
+
+    def index_sizeof(self) -> int:
+        size = sys.getsizeof(self.data) + sys.getsizeof(self._phone_owners)
+        size += self._sorted_names.sizeof() if self._sorted_names is not None else 0
+        size += self._name_keys.sizeof() if self._name_keys is not None else 0
+        size += self._trigram_sizeof()
+        size += sum(sys.getsizeof(owners) for owners in self._phone_owners.values() if isinstance(owners, tuple))
+        size += sys.getsizeof(self._birthday_buckets)
+        size += sum(sys.getsizeof(bucket) for bucket in self._birthday_buckets)
+        return size
+
+    def _index_record(self, record: Record):
+        record._book = self
+        if self.compact_phones:
+            record.use_compact_phones()
+        for phone_number in record._phones.numbers():
+            self._index_phone(record, phone_number)
+        if record.birthday:
+            self._birthday_bucket(record.birthday.value)[record] = None
+
+    def _unindex_record(self, record: Record):
+        for phone_number in record._phones.numbers():
+            self._unindex_phone(record, phone_number)
+        if record.birthday:
+            self._birthday_bucket(record.birthday.value).pop(record)
+        record._book = None
+
+    # A 10-digit int takes about half the memory of the string. Callers pass validated numbers
+    def _phone_key(self, phone_number: str) -> str | int:
+        return int(phone_number) if self.compact_phones else phone_number
+
+    def _owners_of(self, key: str | int) -> tuple[Record, ...]:
+        owners = self._phone_owners.get(key, ())
+        return (owners,) if isinstance(owners, Record) else owners
+
+    def _index_phone(self, record: Record, phone_number: str):
+        key = self._phone_key(phone_number)
+        owners = self._owners_of(key)
+        self._phone_owners[key] = owners + (record,) if owners else record
+
+    def _unindex_phone(self, record: Record, phone_number: str):
+        key = self._phone_key(phone_number)
+        remaining = tuple(owner for owner in self._owners_of(key) if owner is not record)
+        if len(remaining) > 1:
+            self._phone_owners[key] = remaining
+        elif remaining:
+            self._phone_owners[key] = remaining[0]
+        else:
+            del self._phone_owners[key]
+
+    def _birthday_bucket(self, day) -> dict[Record, None]:
+        return self._birthday_buckets[day_slot(day.month, day.day)]
+
+    # Called by records of this book after they change
+    def _phone_added(self, record: Record, phone_number: str):
+        self._index_phone(record, phone_number)
+        self._record_change('add_phone', record.name.value, phone_number)
+
+    def _phone_removed(self, record: Record, phone_number: str):
+        self._unindex_phone(record, phone_number)
+        self._record_change('remove_phone', record.name.value, phone_number)
+
+    def _phone_edited(self, record: Record, current_number: str, new_number: str):
+        self._unindex_phone(record, current_number)
+        self._index_phone(record, new_number)
+        self._record_change('edit_phone', record.name.value, current_number, new_number)
+
+    def _birthday_changed(self, record: Record, previous: Birthday | None):
+        if previous:
+            self._birthday_bucket(previous.value).pop(record)
+        self._birthday_bucket(record.birthday.value)[record] = None
+        self._record_change('add_birthday', record.name.value, record.birthday_to_string())
+
+    # Records celebrating on a given date
+    def _birthdays_on(self, day):
+        yield from self._birthday_bucket(day)
+        if is_feb_29_substitute(day):
+            yield from self._birthday_buckets[FEB_29_SLOT]
+
+    # One bucket lookup per day
+    def _birthdays_in(self, days):
+        for day in days:
+            for record in self._birthdays_on(day):
+                yield day, record
+
     # Add a new record
+    @synchronized(write=True)
     def add_record(self, record: Record):
-        self.data[record.name.value] = record
+        self[record.name.value] = record
 
-    # Find a record by contact name
+    # Find a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized()
     def find(self, name: str):
-        return self.data.get(name)
+        record = self.data.get(name)
+        if record is None:
+            stored = self._resolve_name(name)
+            if stored is not None:
+                record = self.data.get(stored)
+        return record
+
+    # Find records owning a phone number
+    @synchronized()
+    def find_by_phone(self, phone_number: str) -> list[Record]:
+        if self.compact_phones and not (len(phone_number) == 10 and phone_number.isdigit()):
+            return []
+        return list(self._owners_of(self._phone_key(phone_number)))
+
+    # Delete a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized(write=True)
+    def delete(self, name: str):
+        if name not in self.data:
+            name = self._resolve_name(name)
+        if name is None:
+            return False
+        del self[name]
+        return True
+
 
-    # Delete a record by contact name
+# Columnar books at least this large scan birthday slots with NumPy when it is installed
+VECTORIZED_MIN_ROWS = 50_000
+
+
+class ColumnarAddressBook(BaseAddressBook):
+    """AddressBook keeping contacts in contiguous columns: names, birthday ordinals and CSR phone arrays"""
+
+    # Deleted and rewritten rows, and phone entries left behind by them, tolerated before the columns are rebuilt
+    COMPACT_MIN_DEAD_ROWS = 1024
+    COMPACT_MIN_DEAD_PHONES = 4096
+    RECENT_RECORDS = 64
+
+    def __init__(self, records=()):
+        self._names: list[str | None] = []
+        self._rows: dict[str, int] = {}
+        # Date ordinal and calendar slot of the birthday, 0 and -1 when not set
+        self._birthdays = array('l')
+        self._birthday_slots = array('h')
+        # Phones of row i are _phone_numbers[_phone_offsets[i]:_phone_offsets[i + 1]]
+        self._phone_offsets = array('q', [0])
+        self._phone_numbers = array('q')
+        # Name of the live row owning each packed number, a tuple of names for shared numbers.
+        # Names stay valid when rows move
+        self._phone_owners: dict[int, str | tuple[str, ...]] = {}
+        self._dead_rows = 0
+        self._dead_phones = 0
+        self.journal: Journal | None = None
+        # Materialized records, so every caller shares one object per contact
+        self._records = weakref.WeakValueDictionary()
+        # Concurrent readers materialize records one at a time
+        self._records_lock = threading.Lock()
+        # The last materialized records stay alive between commands, so a run of changes to one contact
+        # does not copy its phones out of the columns every time
+        self._recent_records: deque[Record] = deque(maxlen=self.RECENT_RECORDS)
+        for record in records:
+            self._append_row(record)
+        self._sorted_names = SortedNames(self._rows)
+        self._name_keys = NameKeys(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def __getstate__(self):
+        self._compact()
+        return {
+            'names': self._names, 'birthdays': self._birthdays, 'birthday_slots': self._birthday_slots,
+            'phone_offsets': self._phone_offsets, 'phone_numbers': self._phone_numbers, 'lsn': self._lsn,
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._names = state['names']
+        self._rows = {name: row for row, name in enumerate(self._names)}
+        self._sorted_names = SortedNames(self._rows)
+        self._name_keys = NameKeys(self._rows)
+        self._birthdays = state['birthdays']
+        self._birthday_slots = state['birthday_slots']
+        self._phone_offsets = state['phone_offsets']
+        self._phone_numbers = state['phone_numbers']
+        for row, name in enumerate(self._names):
+            self._index_phones(row, name)
+        self._lsn = state['lsn']
+
+    # Copies of the columns, plain memory copies that later appends and dropped rows do not touch.
+    # The copy is compacted while it is pickled
+    def _snapshot_writer(self):
+        copy = ColumnarAddressBook()
+        copy._names, copy._rows = list(self._names), dict(self._rows)
+        copy._birthdays, copy._birthday_slots = self._birthdays[:], self._birthday_slots[:]
+        copy._phone_offsets, copy._phone_numbers = self._phone_offsets[:], self._phone_numbers[:]
+        copy._dead_rows, copy._dead_phones, copy._lsn = self._dead_rows, self._dead_phones, self._lsn
+        return lambda f: pickle.dump(copy, f)
+
+    def index_sizeof(self) -> int:
+        size = self._sorted_names.sizeof() + self._name_keys.sizeof() + self._trigram_sizeof()
+        size += sys.getsizeof(self._rows) + sys.getsizeof(self._phone_owners)
+        size += sum(sys.getsizeof(number) for number in self._phone_owners)
+        size += sum(sys.getsizeof(owners) for owners in self._phone_owners.values() if isinstance(owners, tuple))
+        return size
+
+    # Bytes held by the columns themselves, which is all the record data of this engine
+    def column_sizeof(self) -> int:
+        size = sum(sys.getsizeof(column) for column in (
+            self._names, self._birthdays, self._birthday_slots, self._phone_offsets, self._phone_numbers,
+        ))
+        return size + sum(sys.getsizeof(name) for name in self._names if name is not None)
+
+    def values(self):
+        return (self._record_at(row) for row in self._rows.values())
+
+    def _record_at(self, row: int) -> Record:
+        name = self._names[row]
+        record = self._records.get(name)
+        if record is not None:
+            return record
+        with self._records_lock:
+            return self._records.get(name) or self._materialize(row, name)
+
+    def _materialize(self, row: int, name: str) -> Record:
+        record = Record(name, compact_phones=True)
+        record._phones._set_numbers(self._row_numbers(row))
+        if self._birthdays[row]:
+            record.birthday = Birthday.from_date(date.fromordinal(self._birthdays[row]))
+        record._book = self
+        self._records[name] = record
+        self._recent_records.append(record)
+        return record
+
+    # Rewritten contacts keep their place in _rows, which defines the order of the book. Owners are kept
+    # by name, so a rewrite only updates the owners of numbers the contact gained or lost
+    def _append_row(self, record: Record):
+        name = record.name.value
+        old_row = self._rows.get(name)
+        old_numbers = set(self._row_numbers(old_row)) if old_row is not None else set()
+        if old_row is not None:
+            self._drop_row(old_row)
+        self._rows[name] = len(self._names)
+        self._names.append(name)
+        birthday = record.birthday.value if record.birthday else None
+        self._birthdays.append(birthday.toordinal() if birthday else 0)
+        self._birthday_slots.append(day_slot(birthday.month, birthday.day) if birthday else -1)
+        start = len(self._phone_numbers)
+        if record.compact_phones:
+            self._phone_numbers.extend(record._phones._numbers)
+        else:
+            self._phone_numbers.extend(int(phone_number) for phone_number in record._phones.numbers())
+        self._phone_offsets.append(len(self._phone_numbers))
+        new_numbers = set(self._phone_numbers[start:])
+        for number in old_numbers - new_numbers:
+            self._remove_owner(number, name)
+        for number in new_numbers - old_numbers:
+            self._add_owner(number, name)
+
+    # Owners of the row's numbers are left to the caller
+    def _drop_row(self, row: int):
+        self._names[row] = None
+        self._birthday_slots[row] = -1
+        self._dead_rows += 1
+        self._dead_phones += self._phone_offsets[row + 1] - self._phone_offsets[row]
+
+    def _row_numbers(self, row: int):
+        return self._phone_numbers[self._phone_offsets[row]:self._phone_offsets[row + 1]]
+
+    def _owners_of(self, number: int) -> tuple[str, ...]:
+        owners = self._phone_owners.get(number, ())
+        return (owners,) if isinstance(owners, str) else owners
+
+    def _add_owner(self, number: int, name: str):
+        owners = self._owners_of(number)
+        self._phone_owners[number] = owners + (name,) if owners else name
+
+    def _remove_owner(self, number: int, name: str):
+        remaining = tuple(owner for owner in self._owners_of(number) if owner != name)
+        if len(remaining) > 1:
+            self._phone_owners[number] = remaining
+        elif remaining:
+            self._phone_owners[number] = remaining[0]
+        else:
+            del self._phone_owners[number]
+
+    def _index_phones(self, row: int, name: str):
+        for number in self._row_numbers(row):
+            self._add_owner(number, name)
+
+    def _unindex_phones(self, row: int, name: str):
+        for number in self._row_numbers(row):
+            self._remove_owner(number, name)
+
+    # A record whose phones grow or shrink is written as a new row and the old one is dropped
+    def _rewrite_row(self, record: Record):
+        self._append_row(record)
+        self._compact_if_sparse()
+
+    def _is_last_row(self, row: int) -> bool:
+        return row == len(self._names) - 1
+
+    def _compact_if_sparse(self):
+        live_phones = len(self._phone_numbers) - self._dead_phones
+        if (self._dead_rows > max(self.COMPACT_MIN_DEAD_ROWS, len(self._rows))
+                or self._dead_phones > max(self.COMPACT_MIN_DEAD_PHONES, live_phones)):
+            self._compact()
+
+    # Rebuild the columns without dead rows
+    def _compact(self):
+        if not self._dead_rows:
+            return
+        live = list(self._rows.values())
+        offsets, numbers = array('q', [0]), array('q')
+        for row in live:
+            numbers.extend(self._phone_numbers[self._phone_offsets[row]:self._phone_offsets[row + 1]])
+            offsets.append(len(numbers))
+        self._names = [self._names[row] for row in live]
+        self._rows = {name: row for row, name in enumerate(self._names)}
+        self._birthdays = array('l', (self._birthdays[row] for row in live))
+        self._birthday_slots = array('h', (self._birthday_slots[row] for row in live))
+        self._phone_offsets, self._phone_numbers = offsets, numbers
+        self._dead_rows = self._dead_phones = 0
+
+    # Add a new record
+    @synchronized(write=True)
+    def add_record(self, record: Record):
+        name = record.name.value
+        if name not in self._rows:
+            self._name_added(name)
+        self._forget(name)
+        self._rewrite_row(record)
+        record._book = self
+        self._records[name] = record
+        self._record_change('add_record', name, list(record._phones.numbers()), record.birthday_to_string())
+
+    # Find a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized()
+    def find(self, name: str):
+        row = self._rows.get(name)
+        if row is None:
+            stored = self._resolve_name(name)
+            row = self._rows.get(stored) if stored is not None else None
+        return self._record_at(row) if row is not None else None
+
+    # Find records owning a phone number, in book order
+    @synchronized()
+    def find_by_phone(self, phone_number: str) -> list[Record]:
+        if len(phone_number) != 10 or not phone_number.isdigit():
+            return []
+        rows = sorted(self._rows[name] for name in self._owners_of(int(phone_number)))
+        return [self._record_at(row) for row in rows]
+
+    # Delete a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized(write=True)
     def delete(self, name: str):
-        if name in self.data:
-            del self.data[name]
-            return True
-        return False
+        if name not in self._rows:
+            name = self._resolve_name(name)
+        if name is None:
+            return False
+        row = self._rows.pop(name)
+        self._unindex_phones(row, name)
+        self._drop_row(row)
+        self._name_removed(name)
+        self._forget(name)
+        self._record_change('delete', name)
+        self._compact_if_sparse()
+        return True
 
-    # Return a list of contacts having birthdays in 7 days (including today date)
-    def get_upcoming_birthdays(self):
-        today = datetime.today().date()
-        upcoming_birthdays = []
+    def _forget(self, name: str):
+        record = self._records.pop(name, None)
+        if record is not None:
+            record._book = None
+
+    # One pass over the slot column for the whole window
+    def _birthdays_in(self, days):
+        wanted = slot_positions(days)
+        found: list[list[int]] = [[] for _ in days]
+        for row, slot in self._rows_in_slots(wanted):
+            for position in wanted[slot]:
+                found[position].append(row)
+
+        for day, rows in zip(days, found):
+            for row in rows:
+                yield day, self._record_at(row)
+
+    # (row, slot) pairs of rows whose birthday falls into one of the slots, in row order
+    def _rows_in_slots(self, slots) -> list[tuple[int, int]]:
+        if np is not None and len(self._birthday_slots) >= VECTORIZED_MIN_ROWS:
+            column = np.frombuffer(self._birthday_slots, dtype=np.int16)
+            rows = np.flatnonzero(np.isin(column, list(slots)))
+            matches = list(zip(rows.tolist(), column[rows].tolist()))
+            # Release the view, arrays cannot grow while their buffer is exported
+            del column
+            return matches
+        return [(row, slot) for row, slot in enumerate(self._birthday_slots) if slot in slots]
+
+    # Called by records of this book after they change. Edits and birthdays change the row in place.
+    # Only the last row can grow or shrink in place, another row is moved to the end first, so a run of
+    # changes to one contact copies its phones once
+    def _phone_added(self, record: Record, phone_number: str):
+        name = record.name.value
+        if self._is_last_row(self._rows[name]):
+            number = int(phone_number)
+            self._phone_numbers.append(number)
+            self._phone_offsets[-1] += 1
+            self._add_owner(number, name)
+        else:
+            self._rewrite_row(record)
+        self._record_change('add_phone', name, phone_number)
+
+    def _phone_removed(self, record: Record, phone_number: str):
+        name = record.name.value
+        row = self._rows[name]
+        if self._is_last_row(row):
+            number = int(phone_number)
+            del self._phone_numbers[self._phone_numbers.index(number, self._phone_offsets[row])]
+            self._phone_offsets[-1] -= 1
+            self._remove_owner(number, name)
+        else:
+            self._rewrite_row(record)
+        self._record_change('remove_phone', name, phone_number)
+
+    def _phone_edited(self, record: Record, current_number: str, new_number: str):
+        name = record.name.value
+        row = self._rows[name]
+        current, new = int(current_number), int(new_number)
+        position = self._phone_numbers.index(current, self._phone_offsets[row], self._phone_offsets[row + 1])
+        self._phone_numbers[position] = new
+        self._remove_owner(current, name)
+        self._add_owner(new, name)
+        self._record_change('edit_phone', name, current_number, new_number)
+
+    def _birthday_changed(self, record: Record, previous: Birthday | None):
+        row = self._rows[record.name.value]
+        birthday = record.birthday.value
+        self._birthdays[row] = birthday.toordinal()
+        self._birthday_slots[row] = day_slot(birthday.month, birthday.day)
+        self._record_change('add_birthday', record.name.value, record.birthday_to_string())
+
+
+LAZY_MAGIC = b"ABOOKLZ2"
+# Lazy snapshots written before the header carried a checksum
+LAZY_MAGIC_UNCHECKED = b"ABOOKLZ1"
+
+
+# Stable 64-bit hash of a contact name, used as the key of the lazy snapshot index
+def name_hash(name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def encode_lazy_blob(name: str, record: Record) -> bytes:
+    name_bytes = name.encode("utf-8")
+    payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+    return LazySnapshot.BLOB.pack(len(name_bytes), len(payload)) + name_bytes + payload
+
+
+class LazySnapshot:
+    """Memory-mapped snapshot: record blobs followed by an index of (name hash, offset) sorted by hash"""
+
+    # Magic, number of records, offset of the index, sequence number of the last change,
+    # checksum of the fields before it and everything after the header, see _checksum
+    HEADER = struct.Struct("<8sQQQI")
+    UNCHECKED_HEADER = struct.Struct("<8sQQQ")
+    ENTRY = struct.Struct("<QQ")
+    # Name length and pickle length preceding the name and the pickled record
+    BLOB = struct.Struct("<II")
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise pickle.UnpicklingError(f"Empty snapshot {filename}")
+        try:
+            self._check(filename)
+        except Exception:
+            self._map.close()
+            raise
+
+    # Blobs are only read on demand, so the whole file is checked up front for a fallback to an older
+    # generation instead of a partial book
+    def _check(self, filename: str):
+        header = self.UNCHECKED_HEADER if self._map[:len(LAZY_MAGIC)] == LAZY_MAGIC_UNCHECKED else self.HEADER
+        if len(self._map) < header.size:
+            raise pickle.UnpicklingError(f"Damaged snapshot {filename}")
+        magic, self.count, self._index_offset, self.lsn, *checksum = header.unpack_from(self._map)
+        self._blobs_offset = header.size
+        if (magic not in (LAZY_MAGIC, LAZY_MAGIC_UNCHECKED)
+                or self._index_offset + self.count * self.ENTRY.size != len(self._map)):
+            raise pickle.UnpicklingError(f"Damaged snapshot {filename}")
+        if checksum:
+            with memoryview(self._map) as view, view[header.size:] as body:
+                if self._checksum(self._map[:self.UNCHECKED_HEADER.size], zlib.crc32(body)) != checksum[0]:
+                    raise pickle.UnpicklingError(f"Damaged snapshot {filename}")
+
+    # Write (name, blob) pairs in this format, records of a lazy book that were never loaded are raw bytes
+    @classmethod
+    def write(cls, blobs, lsn: int, f):
+        f.write(cls.HEADER.pack(LAZY_MAGIC, 0, 0, 0, 0))
+        entries = []
+        checksum = 0
+        for name, blob in blobs:
+            entries.append((name_hash(name), f.tell()))
+            f.write(blob)
+            checksum = zlib.crc32(blob, checksum)
+        index_offset = f.tell()
+        entries.sort()
+        for entry in entries:
+            packed = cls.ENTRY.pack(*entry)
+            f.write(packed)
+            checksum = zlib.crc32(packed, checksum)
+        fields = cls.UNCHECKED_HEADER.pack(LAZY_MAGIC, len(entries), index_offset, lsn)
+        f.seek(0)
+        f.write(fields + struct.pack("<I", cls._checksum(fields, checksum)))
+        f.seek(0, os.SEEK_END)
+
+    # The body is written before the header fields are known, so its CRC32 is folded in afterwards
+    @staticmethod
+    def _checksum(fields: bytes, body_crc: int) -> int:
+        return zlib.crc32(struct.pack("<I", body_crc), zlib.crc32(fields))
+
+    def close(self):
+        self._map.close()
+
+    def _name_at(self, offset: int):
+        name_length, payload_length = self.BLOB.unpack_from(self._map, offset)
+        start = offset + self.BLOB.size
+        return str(self._map[start:start + name_length], "utf-8"), start + name_length + payload_length
+
+    # (name, offset) of every record in file order
+    def __iter__(self):
+        offset = self._blobs_offset
+        while offset < self._index_offset:
+            name, end = self._name_at(offset)
+            yield name, offset
+            offset = end
+
+    def load(self, offset: int) -> Record:
+        name_length, payload_length = self.BLOB.unpack_from(self._map, offset)
+        start = offset + self.BLOB.size + name_length
+        return pickle.loads(self._map[start:start + payload_length])
+
+    def raw(self, offset: int) -> bytes:
+        return self._map[offset:self._name_at(offset)[1]]
+
+    # Binary search of the index, then compare names of entries sharing the hash
+    def find(self, name: str):
+        key = name_hash(name)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.ENTRY.unpack_from(self._map, self._index_offset + middle * self.ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low, self.count):
+            entry_key, offset = self.ENTRY.unpack_from(self._map, self._index_offset + position * self.ENTRY.size)
+            if entry_key != key:
+                break
+            if self._name_at(offset)[0] == name:
+                return offset
+        return None
+
+
+class LazyAddressBook(AddressBook):
+    """AddressBook backed by a LazySnapshot, records are unpickled on first access and kept in memory"""
+
+    concurrent_reads = False
+    # Snapshot read by a running checkpoint, closed by the checkpoint if the book lets go of it meanwhile
+    _checkpoint_snapshot: LazySnapshot | None = None
+
+    def __init__(self, snapshot: LazySnapshot | None = None):
+        super().__init__()
+        self._snapshot = snapshot
+        # Snapshot names already loaded (and possibly deleted since), never read from the snapshot again
+        self._resolved: set[str] = set()
+        # Names changed since the snapshot was mapped, unchanged loaded records are saved as raw bytes
+        self._changed: set[str] = set()
+        if snapshot is not None:
+            self._lsn = snapshot.lsn
+            # Built by the first search or inexact lookup, opening the book does not read every name
+            self._sorted_names = None
+            self._name_keys = None
+
+    def __len__(self):
+        if self._snapshot is None:
+            return len(self.data)
+        return len(self.data) + self._snapshot.count - len(self._resolved)
+
+    def __iter__(self):
+        self._load_all()
+        return iter(self.data)
+
+    def __contains__(self, name):
+        return self._load(name) is not None
+
+    def __getitem__(self, name):
+        record = self._load(name)
+        if record is None:
+            raise KeyError(name)
+        return record
+
+    def __setitem__(self, name: str, record: Record):
+        self._load(name)
+        super().__setitem__(name, record)
+
+    def __delitem__(self, name: str):
+        self._load(name)
+        super().__delitem__(name)
+
+    def __getstate__(self):
+        self._load_all()
+        return super().__getstate__()
+
+    # Find a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized()
+    def find(self, name: str):
+        record = self._load(name)
+        if record is None:
+            stored = self._resolve_name(name)
+            if stored is not None and stored != name:
+                record = self._load(stored)
+        return record
+
+    # Record stored under exactly this name, loaded from the snapshot on first access
+    def _load(self, name: str):
+        record = self.data.get(name)
+        if record is not None or self._snapshot is None or name in self._resolved:
+            return record
+        offset = self._snapshot.find(name)
+        if offset is None:
+            return None
+        record = self._snapshot.load(offset)
+        self._resolved.add(name)
+        self.data[name] = record
+        self._index_record(record)
+        return record
+
+    @synchronized(write=True)
+    def delete(self, name: str):
+        record = self.find(name)
+        return super().delete(record.name.value) if record is not None else False
+
+    def _record_change(self, op: str, *args):
+        self._changed.add(args[0])
+        super()._record_change(op, *args)
+
+    # Queries over the whole book need every record in memory
+    @synchronized()
+    def find_by_phone(self, phone_number: str) -> list[Record]:
+        self._load_all()
+        return super().find_by_phone(phone_number)
+
+    def _birthdays_in(self, days):
+        self._load_all()
+        return super()._birthdays_in(days)
+
+    def index_sizeof(self) -> int:
+        return super().index_sizeof() + sys.getsizeof(self._resolved)
+
+    # Names come from blob headers of the snapshot, records are only unpickled when asked for
+    def _all_names(self) -> list[str]:
+        names = list(self.data)
+        if self._snapshot is not None:
+            names.extend(name for name, _ in self._snapshot if name not in self._resolved)
+        return names
+
+    def _name_index(self) -> SortedNames:
+        if self._sorted_names is None:
+            self._sorted_names = SortedNames(self._all_names())
+        return self._sorted_names
+
+    def _resolve_name(self, name: str) -> str | None:
+        if self._name_keys is None:
+            self._name_keys = NameKeys(self._all_names())
+        return super()._resolve_name(name)
+
+    # The map is closed while the files move and the new snapshot is mapped afterwards. It holds every
+    # record the book has not loaded, unchanged. A map still read by a running checkpoint is left open
+    @contextmanager
+    def _snapshot_released(self, filename: str):
+        with self.locked(write=True):
+            snapshot = self._snapshot
+            if snapshot is None or snapshot is self._checkpoint_snapshot:
+                yield
+                return
+            snapshot.close()
+            try:
+                yield
+            finally:
+                self._snapshot = LazySnapshot(filename)
+
+    # Lazy snapshots keep no book-wide flag and unchanged records are saved as their original blobs,
+    # so packing phones leaves nothing to save
+    @synchronized(write=True)
+    def use_compact_phones(self):
+        if not self.compact_phones:
+            self._pack_phones()
+
+    # Load the rest of the snapshot, keeping snapshot order and putting new contacts last
+    def _load_all(self):
+        if self._snapshot is None:
+            return
+        data = {}
+        for name, offset in self._snapshot:
+            if name not in self._resolved:
+                record = self._snapshot.load(offset)
+                data[name] = record
+                self._index_record(record)
+            elif name in self.data:
+                data[name] = self.data[name]
+        for name, record in self.data.items():
+            data.setdefault(name, record)
+        self.data = data
+        if self._snapshot is not self._checkpoint_snapshot:
+            self._snapshot.close()
+        self._snapshot = None
+        self._resolved = set()
+        self._changed = set()
+
+    def _lazy_items(self):
+        if self._snapshot is None:
+            yield from super()._lazy_items()
+            return
+        written = set()
+        for name, offset in self._snapshot:
+            if name not in self._resolved or name not in self._changed:
+                if name in self._resolved:
+                    written.add(name)
+                yield name, self._snapshot.raw(offset)
+            elif name in self.data:
+                written.add(name)
+                yield name, self.data[name]
+        for name, record in self.data.items():
+            if name not in written:
+                yield name, record
+
+    # Same order as _lazy_items. Loaded records are copied on write, unchanged ones are read from the map,
+    # which stays open for the checkpoint even if the book loads everything meanwhile
+    def _snapshot_writer(self):
+        copy_records = self._copy_on_write()
+        snapshot, resolved, changed = self._snapshot, set(self._resolved), set(self._changed)
+        self._checkpoint_snapshot = snapshot
+        lsn, compact_phones = self._lsn, self.compact_phones
+
+        def blobs():
+            frozen = {data[0]: data for data in copy_records()}
+            written = set()
+            try:
+                for name, offset in snapshot if snapshot is not None else ():
+                    if name not in resolved or name not in changed:
+                        if name in resolved:
+                            written.add(name)
+                        yield name, snapshot.raw(offset)
+                    elif name in frozen:
+                        written.add(name)
+                        yield name, encode_lazy_blob(name, Record.from_tuple(frozen[name], compact_phones))
+            finally:
+                with self.locked(write=True):
+                    self._checkpoint_snapshot = None
+                    if snapshot is not None and snapshot is not self._snapshot:
+                        snapshot.close()
+            for name, data in frozen.items():
+                if name not in written:
+                    yield name, encode_lazy_blob(name, Record.from_tuple(data, compact_phones))
+        return lambda f: LazySnapshot.write(blobs(), lsn, f)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    birthday TEXT,
+    birthday_slot INTEGER,
+    name_key TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_birthday_slot ON contacts (birthday_slot);
+CREATE TABLE IF NOT EXISTS phones (
+    contact_id INTEGER NOT NULL REFERENCES contacts (id) ON DELETE CASCADE,
+    phone TEXT NOT NULL,
+    PRIMARY KEY (contact_id, phone)
+);
+CREATE INDEX IF NOT EXISTS phones_phone ON phones (phone);
+"""
+
+
+class SQLiteAddressBook(BaseAddressBook):
+    """AddressBook stored row by row in an SQLite database instead of a pickle"""
+
+    # One connection and transaction depth are shared, so threads take turns
+    concurrent_reads = False
+
+    def __init__(self, filename: str):
+        self._conn = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._depth = 0
+        self._add_name_keys()
+        # Loaded records, so every caller shares one object per contact
+        self._records = weakref.WeakValueDictionary()
+
+    # Databases created before names were normalized get the name_key column filled in
+    def _add_name_keys(self):
+        columns = {column for _, column, *_ in self._conn.execute("PRAGMA table_info(contacts)")}
+        if 'name_key' not in columns:
+            self._conn.create_function("normalize_name", 1, normalize_name, deterministic=True)
+            with self.batch() as conn:
+                conn.execute("ALTER TABLE contacts ADD COLUMN name_key TEXT")
+                conn.execute("UPDATE contacts SET name_key = normalize_name(name)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS contacts_name_key ON contacts (name_key)")
+
+    # Group statements into one transaction, nested calls join the outer one
+    @contextmanager
+    def batch(self):
+        if self._depth == 0:
+            self._conn.execute("BEGIN")
+        self._depth += 1
+        try:
+            yield self._conn
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.execute("ROLLBACK")
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        self._conn.close()
+
+    # Every change is committed to the database as it happens, there are no snapshots to checkpoint
+    def _snapshot_writer(self):
+        raise TypeError("SQLite books are durable on their own and take no checkpoints")
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def __iter__(self):
+        return (name for name, in self._conn.execute("SELECT name FROM contacts ORDER BY id"))
+
+    def __contains__(self, name):
+        return self._conn.execute("SELECT 1 FROM contacts WHERE name = ?", (name,)).fetchone() is not None
+
+    # All records in insertion order, read with a single query
+    def values(self):
+        rows = self._conn.execute(
+            "SELECT c.name, c.birthday, p.phone FROM contacts c "
+            "LEFT JOIN phones p ON p.contact_id = c.id ORDER BY c.id, p.rowid"
+        )
+        record, cached = None, False
+        for name, birthday, phone in rows:
+            if record is None or record.name.value != name:
+                if record is not None:
+                    yield record
+                record = self._records.get(name)
+                cached = record is not None
+                if not cached:
+                    record = self._build_record(name, birthday, ())
+            if phone is not None and not cached:
+                record._phones.add(Phone(phone))
+        if record is not None:
+            yield record
+
+    def _build_record(self, name: str, birthday: str | None, phones):
+        record = Record(name)
+        for phone in phones:
+            record.add_phone(phone)
+        if birthday:
+            record.add_birthday(birthday)
+        record._book = self
+        self._records[name] = record
+        return record
+
+    # Add a new record, replacing a stored contact with the same name
+    @synchronized(write=True)
+    def add_record(self, record: Record):
+        name = record.name.value
+        birthday = record.birthday
+        with self.batch() as conn:
+            conn.execute("DELETE FROM contacts WHERE name = ?", (name,))
+            contact_id = conn.execute(
+                "INSERT INTO contacts (name, birthday, birthday_slot, name_key) VALUES (?, ?, ?, ?)",
+                (name, record.birthday_to_string(),
+                 day_slot(birthday.value.month, birthday.value.day) if birthday else None, normalize_name(name)),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO phones (contact_id, phone) VALUES (?, ?)",
+                ((contact_id, phone_number) for phone_number in record._phones.numbers()),
+            )
+        self._name_added(name)
+        self._forget(name)
+        record._book = self
+        self._records[name] = record
+
+    # Find a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized()
+    def find(self, name: str):
+        record = self._records.get(name)
+        if record is not None:
+            return record
+        row = self._conn.execute("SELECT id, birthday FROM contacts WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            stored = self._resolve_name(name)
+            return self.find(stored) if stored is not None and stored != name else None
+        contact_id, birthday = row
+        phones = self._conn.execute(
+            "SELECT phone FROM phones WHERE contact_id = ? ORDER BY rowid", (contact_id,)
+        )
+        return self._build_record(name, birthday, (phone for phone, in phones))
+
+    def _resolve_name(self, name: str) -> str | None:
+        row = self._conn.execute(
+            "SELECT name FROM contacts WHERE name_key = ? ORDER BY id LIMIT 1", (normalize_name(name),)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    # Find records owning a phone number
+    @synchronized()
+    def find_by_phone(self, phone_number: str) -> list[Record]:
+        rows = self._conn.execute(
+            "SELECT c.name FROM phones p JOIN contacts c ON c.id = p.contact_id "
+            "WHERE p.phone = ? ORDER BY c.id", (phone_number,)
+        ).fetchall()
+        return [self.find(name) for name, in rows]
+
+    # Range scan of the name_key index, binary collation orders keys like Python strings, so pages come
+    # in the name_order of the in-memory engines
+    @synchronized()
+    def search(self, prefix: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE) -> tuple[list[Record], int]:
+        prefix = normalize_name(prefix)
+        end = prefix_end(prefix)
+        where, params = (("name_key >= ? AND name_key < ?", (prefix, end)) if end is not None
+                         else ("name_key >= ?", (prefix,)))
+        total = self._conn.execute(f"SELECT COUNT(*) FROM contacts WHERE {where}", params).fetchone()[0]
+        rows = self._conn.execute(
+            f"SELECT name FROM contacts WHERE {where} ORDER BY name_key, name LIMIT ? OFFSET ?",
+            (*params, page_size, (page - 1) * page_size),
+        ).fetchall()
+        return [self.find(name) for name, in rows], total
+
+    # Delete a record by contact name, in any case or Unicode form when there is no exact match
+    @synchronized(write=True)
+    def delete(self, name: str):
+        deleted = self._conn.execute("DELETE FROM contacts WHERE name = ?", (name,)).rowcount > 0
+        if deleted:
+            self._name_removed(name)
+        self._forget(name)
+        if not deleted:
+            stored = self._resolve_name(name)
+            return self.delete(stored) if stored is not None and stored != name else False
+        return deleted
+
+    def _forget(self, name: str):
+        record = self._records.pop(name, None)
+        if record is not None:
+            record._book = None
+
+    # One indexed query for the whole window
+    def _birthdays_in(self, days):
+        wanted = slot_positions(days)
+        rows = self._conn.execute(
+            f"SELECT name, birthday_slot FROM contacts WHERE birthday_slot IN ({', '.join('?' * len(wanted))}) "
+            "ORDER BY id",
+            list(wanted),
+        ).fetchall()
+        found: list[list[str]] = [[] for _ in days]
+        for name, slot in rows:
+            for position in wanted[slot]:
+                found[position].append(name)
+        for day, names in zip(days, found):
+            for name in names:
+                yield day, self.find(name)
+
+    # Called by records of this book after they change
+    def _phone_added(self, record: Record, phone_number: str):
+        self._conn.execute(
+            "INSERT INTO phones (contact_id, phone) SELECT id, ? FROM contacts WHERE name = ?",
+            (phone_number, record.name.value),
+        )
+
+    def _phone_removed(self, record: Record, phone_number: str):
+        self._conn.execute(
+            "DELETE FROM phones WHERE phone = ? AND contact_id = (SELECT id FROM contacts WHERE name = ?)",
+            (phone_number, record.name.value),
+        )
+
+    def _phone_edited(self, record: Record, current_number: str, new_number: str):
+        self._conn.execute(
+            "UPDATE phones SET phone = ? WHERE phone = ? AND contact_id = (SELECT id FROM contacts WHERE name = ?)",
+            (new_number, current_number, record.name.value),
+        )
+
+    def _birthday_changed(self, record: Record, previous: Birthday | None):
+        birthday = record.birthday.value
+        self._conn.execute(
+            "UPDATE contacts SET birthday = ?, birthday_slot = ? WHERE name = ?",
+            (record.birthday_to_string(), day_slot(birthday.month, birthday.day), record.name.value),
+        )
+
+
+class Journal:
+    """Append-only log of AddressBook changes made since the last snapshot"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.entries = 0
+        self._file = open(filename, "a", encoding="utf-8")
+        self._buffer: list[str] | None = None
+
+    # Write one change as a JSON line, flushed so it survives the process
+    def append(self, lsn: int, op: str, *args):
+        line = json.dumps([lsn, op, *args], ensure_ascii=False) + "\n"
+        if self._buffer is not None:
+            self._buffer.append(line)
+        else:
+            self._file.write(line)
+            self._file.flush()
+        self.entries += 1
+
+    # Collect entries in memory and write them with a single flush
+    @contextmanager
+    def buffered(self):
+        if self._buffer is not None:
+            yield
+            return
+        self._buffer = []
+        try:
+            yield
+        finally:
+            lines, self._buffer = self._buffer, None
+            self._file.write("".join(lines))
+            self._file.flush()
+
+    @property
+    def rotated_filename(self) -> str:
+        return self.filename + JOURNAL_ROTATED_SUFFIX
+
+    # Drop all entries once they are folded into a snapshot
+    def truncate(self):
+        self._file.truncate(0)
+        self.entries = 0
+        self.drop_rotated()
+
+    # Move entries aside while a checkpoint writes them into a snapshot, new entries go to a fresh file.
+    # Entries left by a checkpoint that failed are kept in front of them
+    def rotate(self):
+        self._file.close()
+        if os.path.exists(self.rotated_filename):
+            with open(self.filename, encoding="utf-8") as src, open(self.rotated_filename, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            os.remove(self.filename)
+        else:
+            os.replace(self.filename, self.rotated_filename)
+        self._file = open(self.filename, "a", encoding="utf-8")
+        self.entries = 0
+
+    def drop_rotated(self):
+        try:
+            os.remove(self.rotated_filename)
+        except FileNotFoundError:
+            pass
 
-        for contact in self.data.values():
-            if not contact.birthday:
-                continue
-            birthday_this_year = contact.birthday.value.replace(year=today.year)
+    def close(self):
+        self._file.close()
 
-            if birthday_this_year < today:
-                birthday_this_year = birthday_this_year.replace(year=today.year + 1)
+    # Read entries back, a torn last line left by a crash ends the log
+    @staticmethod
+    def read(filename: str):
+        try:
+            with open(filename, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        return
+        except FileNotFoundError:
+            return
 
-            days_delta = (birthday_this_year - today).days
 
-            if 0 <= days_delta <= 7:
-                congratulation_date = birthday_this_year
+DB_FILENAME = 'addressbook.pkl'
+JOURNAL_SUFFIX = '.journal'
+# Entries being folded into a snapshot by a checkpoint, replayed before the journal itself
+JOURNAL_ROTATED_SUFFIX = '.1'
+# Entries left after a gap in the journal, kept for manual recovery instead of being truncated
+JOURNAL_UNREPLAYED_SUFFIX = '.unreplayed'
+# Journal entries after which main() folds the journal into a new snapshot
+JOURNAL_COMPACT_EVERY = 1000
+# Seconds between background checkpoints of an interactive session
+CHECKPOINT_INTERVAL = 60
+# Records a checkpoint copies per hold of the book lock
+SNAPSHOT_COPY_CHUNK = 1000
+# Snapshots kept on disk: addressbook.pkl, addressbook.pkl.1, addressbook.pkl.2
+SNAPSHOT_GENERATIONS = 3
+
+
+def snapshot_generations(filename: str) -> list[str]:
+    return [filename] + [f"{filename}.{n}" for n in range(1, SNAPSHOT_GENERATIONS)]
+
+
+# Write a snapshot to a temp file, fsync it and atomically move it in place, keeping older generations.
+# The book lets go of files it keeps open while they move, Windows cannot rename a mapped file
+def write_snapshot(filename: str, write, book: "BaseAddressBook | None" = None):
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    generations = snapshot_generations(filename)
+    with book._snapshot_released(filename) if book is not None else nullcontext():
+        for older, newer in zip(generations[:0:-1], generations[-2::-1]):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        os.replace(tmp_filename, filename)
 
-                if congratulation_date.weekday() == 5:
-                    congratulation_date += timedelta(days=2)
-                elif congratulation_date.weekday() == 6:
-                    congratulation_date += timedelta(days=1)
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
 
-                upcoming_birthdays.append({
-                    "name": contact.name.value,
-                    "congratulation_date": congratulation_date.strftime("%d.%m.%Y")
-                })
+class SnapshotState:
+    """State copied from a book, pickled so that it loads as the book itself"""
 
-        return upcoming_birthdays
+    __slots__ = ('cls', 'state')
 
-DB_FILENAME = 'addressbook.pkl'
-# Save data to AddressBook
-def save_data(book: AddressBook, filename: str = DB_FILENAME):
-    with open(filename, "wb") as f:
+    def __init__(self, cls, state):
+        self.cls = cls
+        self.state = state
+
+    # Unpickled as an empty instance of cls given the state, like the book itself
+    def __reduce__(self):
+        return object.__new__, (self.cls,), self.state
+
+# Serialize a book in the snapshot format matching its engine
+def dump_book(book: AddressBook, f):
+    if isinstance(book, LazyAddressBook):
+        LazySnapshot.write(book._lazy_blobs(), book._lsn, f)
+    else:
         pickle.dump(book, f)
 
-# Load data from AddressBook
-def load_data(filename: str = DB_FILENAME):
-    try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
-    except FileNotFoundError:
-        return AddressBook()
+# Save data to AddressBook, a book without changes since its last save or load is not written again
+def save_data(book: AddressBook, filename: str = DB_FILENAME, force: bool = False):
+    if not (force or book.dirty):
+        return False
+    write_snapshot(filename, lambda f: dump_book(book, f), book)
+    if book.journal is not None:
+        book.journal.truncate()
+    book.mark_saved()
+    return True
+
+# Load the newest snapshot generation that is not damaged, lazy snapshots are only mapped.
+# Skipping a damaged generation warns, changes saved only in it are lost unless the journal still has them
+def load_snapshot(filename: str):
+    error = damaged = None
+    for generation in snapshot_generations(filename):
+        try:
+            with open(generation, "rb") as f:
+                if f.read(len(LAZY_MAGIC)) in (LAZY_MAGIC, LAZY_MAGIC_UNCHECKED):
+                    book = LazyAddressBook(LazySnapshot(generation))
+                else:
+                    f.seek(0)
+                    book = pickle.load(f)
+        except FileNotFoundError:
+            continue
+        # Unpickling damaged data can raise almost any exception
+        except Exception as e:
+            error, damaged = e, damaged or generation
+            continue
+        if damaged is not None:
+            warnings.warn(f"Snapshot {damaged} is damaged ({error!r}), loaded older snapshot {generation}",
+                          RuntimeWarning, stacklevel=3)
+        return book
+    if error is not None:
+        raise error
+    return AddressBook()
+
+# Size of an object and everything it references, except types and excluded objects
+def deep_sizeof(obj, exclude=()) -> int:
+    seen = {id(item) for item in exclude}
+    stack = [obj]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        stack.extend(gc.get_referents(item))
+    return size
+
+
+# Longest window accepted by the birthdays command
+MAX_BIRTHDAYS_DAYS = 366
+# Records measured by the memory command
+MEMORY_SAMPLE_SIZE = 1000
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+ENGINES = {'dict': AddressBook, 'columnar': ColumnarAddressBook, 'lazy': LazyAddressBook}
+
+# Open a book by file name: SQLite databases are used in place, pickles are loaded with a journal.
+# Without an engine the book keeps the layout it was saved with
+def open_book(filename: str = DB_FILENAME, compact_phones: bool = False, engine: str | None = None):
+    if filename.endswith(SQLITE_SUFFIXES):
+        return SQLiteAddressBook(filename)
+    book = load_data(filename, journal=True)
+    if engine is not None:
+        book = convert_book(book, ENGINES[engine])
+    if compact_phones and isinstance(book, AddressBook):
+        book.use_compact_phones()
+    return book
+
+# Move records of a pickled book into another in-memory engine, keeping its journal position
+def convert_book(book, engine):
+    if type(book) is engine:
+        return book
+    converted = engine()
+    for record in book.values():
+        converted.add_record(record)
+    converted._lsn, converted.journal = book._lsn, book.journal
+    converted.mark_dirty()
+    return converted
+
+# Persist and release a book opened with open_book
+def close_book(book, filename: str = DB_FILENAME):
+    if isinstance(book, SQLiteAddressBook):
+        book.close()
+        return
+    if book.checkpointer is not None:
+        book.checkpointer.stop()
+    save_data(book, filename)
+    if book.journal is not None:
+        book.journal.close()
+
+# Move journal files aside so the next save does not truncate entries that could not be replayed
+def keep_journal(parts, kept_filename: str):
+    with open(kept_filename, "a", encoding="utf-8") as dst:
+        for part in parts:
+            try:
+                with open(part, encoding="utf-8") as src:
+                    dst.write(src.read())
+            except FileNotFoundError:
+                continue
+            os.remove(part)
+
+# Load data from AddressBook, replaying journaled changes newer than the snapshot
+def load_data(filename: str = DB_FILENAME, journal: bool = False):
+    book = load_snapshot(filename)
+    book.mark_saved()
+
+    replayed = 0
+    missing_from = None
+    journal_filename = filename + JOURNAL_SUFFIX
+    parts = (journal_filename + JOURNAL_ROTATED_SUFFIX, journal_filename)
+    for part in parts:
+        for lsn, op, *args in Journal.read(part):
+            if lsn <= book._lsn:
+                continue
+            # Entries are numbered without holes, a hole means the snapshot is older than the journal.
+            # That happens when a damaged snapshot was skipped, later entries may refer to missing contacts
+            if lsn != book._lsn + 1:
+                missing_from = book._lsn + 1
+                break
+            book._replay(lsn, op, *args)
+            replayed += 1
+        if missing_from is not None:
+            break
+
+    if missing_from is not None:
+        message = (f"Journal of {filename} has a gap after change {missing_from - 1} of the loaded snapshot, "
+                   f"later changes are not replayed")
+        if journal:
+            kept_filename = journal_filename + JOURNAL_UNREPLAYED_SUFFIX
+            keep_journal(parts, kept_filename)
+            message += f" and kept in {kept_filename}"
+        warnings.warn(message, RuntimeWarning, stacklevel=2)
+
+    if journal:
+        book.journal = Journal(journal_filename)
+        book.journal.entries = replayed
+    return book
+
+
+class Checkpointer:
+    """Background thread writing a snapshot every interval seconds or after a number of changes"""
+
+    def __init__(self, book: AddressBook, filename: str = DB_FILENAME,
+                 interval: float = CHECKPOINT_INTERVAL, every: int = JOURNAL_COMPACT_EVERY):
+        self.book = book
+        self.filename = filename
+        self.interval = interval
+        self.every = every
+        book.use_locking()
+        self.checkpoints = 0
+        self.last_duration: float | None = None
+        # Time the last checkpoint held the lock to start, copying then takes it in short steps
+        self.last_lock_duration: float | None = None
+        self.last_bytes = 0
+        self.last_error: Exception | None = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+
+    def start(self):
+        self.book.checkpointer = self
+        self._thread.start()
+        return self
+
+    # Wake the thread early once enough changes piled up, called after each command
+    def changed(self):
+        saved = self.book._saved_lsn
+        if saved is None or self.book._lsn - saved >= self.every:
+            self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self.book.checkpointer = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    # A failed checkpoint keeps its journal entries and is retried, the thread only ends on stop
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.last_error = e
+
+    # Start a copy of the state under the write lock and serialize it to disk without holding it.
+    # Readers are held back too, lazy loading and materialized records change the book while it is read
+    def checkpoint(self) -> bool:
+        started = time.perf_counter()
+        book = self.book
+        with book.locked(write=True):
+            if not book.dirty:
+                return False
+            write = book._snapshot_writer()
+            lsn = book._lsn
+            if book.journal is not None:
+                book.journal.rotate()
+        self.last_lock_duration = time.perf_counter() - started
+        write_snapshot(self.filename, write, book)
+        with book.locked(write=True):
+            if book.journal is not None:
+                book.journal.drop_rotated()
+            book._saved_lsn = lsn
+        self.checkpoints += 1
+        self.last_duration = time.perf_counter() - started
+        self.last_bytes = os.path.getsize(self.filename)
+        self.last_error = None
+        return True
 
 
 def input_error(func):
@@ -186,6 +2505,64 @@ def parse_input(user_input):
     return cmd, *args
 
 
+class Command:
+    """Bot command: handler taking (args, book) with usage and help text, handlers check their own arguments"""
+
+    def __init__(self, name: str, handler, usage: str, help: str, writes: bool = False, local_only: bool = False):
+        self.name = name
+        self.handler = handler
+        self.usage = usage
+        self.help = help
+        # Commands changing the book run under the write lock of a thread-safe book
+        self.writes = writes
+        # Commands reading or writing files of the host are refused to network clients
+        self.local_only = local_only
+
+
+# Registry shared by every entry point that runs bot commands
+COMMANDS: dict[str, Command] = {}
+EXIT_COMMANDS = ("close", "exit")
+
+
+def command(name: str, usage: str = "", help: str = "", writes: bool = False, local_only: bool = False):
+    """Register a handler in COMMANDS"""
+
+    def decorator(func):
+        COMMANDS[name] = Command(name, func, usage, help, writes, local_only)
+        return func
+    return decorator
+
+
+def dispatch(cmd: str, args, book: AddressBook, remote: bool = False) -> str:
+    """Run a command through the registry and return its reply, remote clients only get shared commands"""
+
+    entry = COMMANDS.get(cmd)
+    if entry is None:
+        return "Invalid command."
+    if remote and entry.local_only:
+        return f"Error: {cmd} is not available over the network."
+    with book.locked(entry.writes):
+        return entry.handler(args, book)
+
+
+@command("hello", help="Greet the bot")
+def hello(args, book: AddressBook):
+    """Greet user"""
+
+    return "How can I help you?"
+
+
+@command("help", help="Show available commands")
+def show_help(args, book: AddressBook):
+    """Show available commands"""
+
+    lines = [f"{' '.join((entry.name, entry.usage)).strip()} - {entry.help}" for entry in COMMANDS.values()]
+    lines.append(f"{' | '.join(EXIT_COMMANDS)} - Save and quit")
+    return "\n".join(lines)
+
+
+@command("add", usage="<name> <phone>", help="Add a contact or a phone to an existing contact",
+         writes=True)
 @input_error
 def add_contact(args, book: AddressBook):
     """Add contact to list of contacts"""
@@ -207,6 +2584,8 @@ def add_contact(args, book: AddressBook):
     return "Contact added." if created_record else "Contact updated."
 
 
+@command("change", usage="<name> <old phone> <new phone>", help="Change contact phone number",
+         writes=True)
 @input_error
 def change_contact(args, book: AddressBook):
     """Change contact phone number"""
@@ -222,6 +2601,7 @@ def change_contact(args, book: AddressBook):
     return "Phone updated."
 
 
+@command("phone", usage="<name>", help="Show contact phone numbers")
 @input_error
 def show_phone(args, book: AddressBook):
     """Show contact phone number"""
@@ -234,22 +2614,82 @@ def show_phone(args, book: AddressBook):
     if not record:
         return "Contact does not exist. Try again."
     if not record.phones:
-        return f"{name}: —"
-    return f"{name}: {', '.join(p.value for p in record.phones)}"
+        return f"{record.name.value}: —"
+    return f"{record.name.value}: {', '.join(p.value for p in record.phones)}"
 
 
+@command("phone-owner", usage="<phone>", help="Show contacts owning a phone number")
 @input_error
-def show_all(book: AddressBook):
+def show_phone_owner(args, book: AddressBook):
+    """Show contacts owning a phone number"""
+
+    if len(args) < 1:
+        raise ValueError("Enter phone number")
+
+    phone, *_ = args
+    owners = book.find_by_phone(phone)
+    if not owners:
+        return "No contact with this phone number."
+    return f"{phone}: {', '.join(record.name.value for record in owners)}"
+
+
+@command("all", help="Show all contacts")
+@input_error
+def show_all(args, book: AddressBook):
     """Show all contacts"""
 
-    if not book.data:
+    if not len(book):
         return "No contacts found."
     lines = []
-    for record in book.data.values():
+    for record in book.values():
         lines.append(str(record))
     return "\n".join(lines)
 
 
+@command("search", usage="<prefix> [page]", help=f"Show contacts whose names start with prefix, "
+         f"{SEARCH_PAGE_SIZE} per page")
+@input_error
+def search_contacts(args, book: AddressBook):
+    """Show one page of contacts whose names start with prefix"""
+
+    if len(args) < 1:
+        raise ValueError("Enter name prefix")
+
+    prefix, *rest = args
+    page = 1
+    if rest:
+        if not rest[0].isdigit() or int(rest[0]) < 1:
+            raise ValueError("Page must be a positive number")
+        page = int(rest[0])
+
+    records, total = book.search(prefix, page)
+    if not total:
+        return "No contacts found."
+    pages = -(-total // SEARCH_PAGE_SIZE)
+    if not records:
+        raise ValueError(f"Page must be from 1 to {pages}")
+    lines = [str(record) for record in records]
+    lines.append(f"Page {page} of {pages}, {total} contacts found.")
+    return "\n".join(lines)
+
+
+@command("fuzzy", usage="<name>", help=f"Show up to {FUZZY_LIMIT} contacts with names closest to a misspelled name")
+@input_error
+def fuzzy_search(args, book: AddressBook):
+    """Show contacts with names similar to the given one"""
+
+    if len(args) < 1:
+        raise ValueError("Enter contact name")
+
+    query = " ".join(args)
+    matches = book.fuzzy_find(query)
+    if not matches:
+        return "No similar contacts found."
+    return "\n".join(f"{record} (match {similarity:.0%})" for similarity, record in matches)
+
+
+@command("add-birthday", usage="<name> <DD.MM.YYYY>", help="Add contact birthday",
+         writes=True)
 @input_error
 def add_birthday(args, book: AddressBook):
     """ Add contact birthday"""
@@ -266,6 +2706,7 @@ def add_birthday(args, book: AddressBook):
     return "Birthday added."
 
 
+@command("show-birthday", usage="<name>", help="Show contact birthday")
 @input_error
 def show_birthday(args, book: AddressBook):
     """Show contact birthday"""
@@ -278,17 +2719,24 @@ def show_birthday(args, book: AddressBook):
     if not record:
         return "Contact does not exist."
     if not record.birthday:
-        return f"{name}: birthday not added."
-    return f"{name}: {record.birthday_to_string()}"
+        return f"{record.name.value}: birthday not added."
+    return f"{record.name.value}: {record.birthday_to_string()}"
 
 
+@command("birthdays", usage="[days]", help=f"Show upcoming birthdays within {UPCOMING_BIRTHDAYS_DAYS} or given days")
 @input_error
 def birthdays(args, book: AddressBook):
-    """Show upcoming birthdays within 7 days"""
+    """Show upcoming birthdays within 7 days or given number of days"""
 
-    upcoming = book.get_upcoming_birthdays()
+    days = UPCOMING_BIRTHDAYS_DAYS
+    if args:
+        if not args[0].isdigit() or int(args[0]) > MAX_BIRTHDAYS_DAYS:
+            raise ValueError(f"Number of days must be from 0 to {MAX_BIRTHDAYS_DAYS}")
+        days = int(args[0])
+
+    upcoming = book.get_upcoming_birthdays(days=days)
     if not upcoming:
-        return "No upcoming birthdays within the next 7 days."
+        return f"No upcoming birthdays within the next {days} days."
     grouped = {}
     for item in upcoming:
         date = item["congratulation_date"]
@@ -298,12 +2746,397 @@ def birthdays(args, book: AddressBook):
         lines.append(f"{date}: {', '.join(names)}")
     return "\n".join(lines)
 
+
+@command("import-csv", usage="<file>", help="Import contacts from a CSV file (name,phones,birthday)",
+         writes=True, local_only=True)
+@input_error
+def import_csv(args, book: AddressBook):
+    """Import contacts from CSV file"""
+
+    if len(args) < 1:
+        raise ValueError("Enter CSV file name")
+
+    filename, *_ = args
+    try:
+        imported, skipped = book.import_csv(filename)
+    except OSError as e:
+        raise ValueError(f"Cannot read {filename}: {e.strerror}")
+    return f"Imported {imported} rows, skipped {skipped} invalid rows."
+
+
+@command("export-csv", usage="<file>", help="Export all contacts to a CSV file", local_only=True)
+@input_error
+def export_csv(args, book: AddressBook):
+    """Export contacts to CSV file"""
+
+    if len(args) < 1:
+        raise ValueError("Enter CSV file name")
+
+    filename, *_ = args
+    try:
+        exported = book.export_csv(filename)
+    except OSError as e:
+        raise ValueError(f"Cannot write {filename}: {e.strerror}")
+    return f"Exported {exported} contacts."
+
+
+@command("memory", help="Show memory used per contact")
+@input_error
+def show_memory(args, book: AddressBook):
+    """Show memory used per contact"""
+
+    contacts = len(book)
+    if not contacts:
+        return "No contacts found."
+    # Columnar records exist only while used, the columns hold their data
+    if isinstance(book, ColumnarAddressBook):
+        record_bytes = book.column_sizeof() / contacts
+        source = "columns"
+    else:
+        sample = list(islice(book.values(), MEMORY_SAMPLE_SIZE))
+        record_bytes = sum(deep_sizeof(record, exclude=(book,)) for record in sample) / len(sample)
+        source = f"{len(sample)} sampled"
+    index_bytes = book.index_sizeof() / contacts
+    return (f"Contacts: {contacts}\n"
+            f"Records: ~{record_bytes:.0f} bytes/contact ({source})\n"
+            f"Indexes: ~{index_bytes:.0f} bytes/contact\n"
+            f"Total: ~{record_bytes + index_bytes:.0f} bytes/contact")
+
+
+@command("checkpoint", help="Show background checkpoint interval and statistics")
+@input_error
+def show_checkpoint(args, book: AddressBook):
+    """Show background checkpoint statistics"""
+
+    checkpointer = book.checkpointer
+    if checkpointer is None:
+        return "Background checkpoints are off."
+    lines = [] if checkpointer.running else ["Background checkpoints stopped."]
+    lines += [f"Interval: {checkpointer.interval:g} s or {checkpointer.every} changes",
+              f"Checkpoints: {checkpointer.checkpoints}"]
+    if checkpointer.last_duration is not None:
+        lines.append(f"Last: {checkpointer.last_duration * 1000:.1f} ms "
+                     f"({checkpointer.last_lock_duration * 1000:.1f} ms locked), {checkpointer.last_bytes} bytes")
+    if checkpointer.last_error is not None:
+        lines.append(f"Last error: {checkpointer.last_error}")
+    return "\n".join(lines)
+
+
 def save(book: AddressBook, filename: str=DB_FILENAME):
     save_data(book, filename)
     return "Saved successfully."
 
-def main():
-    book = load_data(DB_FILENAME)
+def is_error_reply(reply: str) -> bool:
+    return reply.startswith("Error") or reply == "Invalid command."
+
+
+def run_batch(lines, book: AddressBook, verbose: bool = False):
+    """Run commands line by line, return buffered output and success/error counters"""
+
+    output = []
+    succeeded = failed = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        command, *args = parse_input(line)
+        if command in EXIT_COMMANDS:
+            break
+        reply = dispatch(command, args, book)
+        if is_error_reply(reply):
+            failed += 1
+        else:
+            succeeded += 1
+        if verbose:
+            output.append(f"{number}: {reply}")
+    output.append(f"Batch finished: {succeeded} succeeded, {failed} failed.")
+    return output, succeeded, failed
+
+
+def batch_main(filename: str = DB_FILENAME, script: str = "-", verbose: bool = False,
+               compact_phones: bool = False, engine: str | None = None):
+    """Run a command script from a file or stdin and save the book once at the end"""
+
+    book = open_book(filename, compact_phones, engine)
+    # The snapshot written at the end covers the whole script, no need to journal each line
+    journal, book.journal = book.journal, None
+    try:
+        with (sys.stdin if script == "-" else open(script, encoding="utf-8")) as lines, book.batch():
+            output, succeeded, failed = run_batch(lines, book, verbose)
+    finally:
+        book.journal = journal
+        close_book(book, filename)
+    sys.stdout.write("\n".join(output) + "\n")
+    return failed == 0
+
+
+# SQLite books are durable on their own, pickled books are checkpointed in the background
+def start_checkpointer(book, filename: str, interval: float):
+    if interval <= 0 or isinstance(book, SQLiteAddressBook):
+        return None
+    return Checkpointer(book, filename, interval).start()
+
+
+SERVER_HOST = '127.0.0.1'
+# Pending connections queued by the OS while the event loop is busy
+SERVER_BACKLOG = 1024
+# Longest command line a client may send
+SERVER_LINE_LIMIT = 64 * 1024
+# Largest request body accepted by the HTTP API
+HTTP_BODY_LIMIT = 64 * 1024
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, book, executor):
+    """Answer the command lines of one connection in order, every reply ends with an empty line"""
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                writer.write(b"Error: Command is too long.\n\n")
+                break
+            if not line:
+                break
+            user_input = line.decode("utf-8", errors="replace").strip()
+            if not user_input:
+                continue
+            command, *args = parse_input(user_input)
+            if command in EXIT_COMMANDS:
+                writer.write(b"Good bye!\n\n")
+                break
+            # Commands may wait for the book lock or write the journal, so they run off the loop
+            reply = await loop.run_in_executor(executor, dispatch, command, args, book, True)
+            if book.checkpointer is not None:
+                book.checkpointer.changed()
+            writer.write(reply.encode("utf-8") + b"\n\n")
+            await writer.drain()
+    # Clients that went away, or connections still open when the server shuts down
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(book, host: str = SERVER_HOST, port: int = 0, executor=None, started=None):
+    """Serve the command set over TCP until cancelled, started is called with the listening server"""
+
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_client(reader, writer, book, executor),
+        host, port, limit=SERVER_LINE_LIMIT, backlog=SERVER_BACKLOG,
+    )
+    async with server:
+        if started is not None:
+            started(server)
+        await server.serve_forever()
+
+
+# Open a book for many threads at once, checkpointed in the background
+def open_shared_book(filename: str = DB_FILENAME, compact_phones: bool = False, engine: str | None = None,
+                     checkpoint_interval: float = CHECKPOINT_INTERVAL):
+    book = open_book(filename, compact_phones, engine).use_locking()
+    start_checkpointer(book, filename, checkpoint_interval)
+    return book
+
+
+def serve_main(filename: str = DB_FILENAME, host: str = SERVER_HOST, port: int = 0, compact_phones: bool = False,
+               engine: str | None = None, checkpoint_interval: float = CHECKPOINT_INTERVAL):
+    """Share one book between many TCP clients, each line is a command as typed in main()"""
+
+    book = open_shared_book(filename, compact_phones, engine, checkpoint_interval)
+    executor = ThreadPoolExecutor(thread_name_prefix="command")
+
+    def started(server):
+        address = server.sockets[0].getsockname()
+        print(f"Serving {filename} on {address[0]}:{address[1]}, press Ctrl+C to stop", flush=True)
+
+    try:
+        asyncio.run(serve(book, host, port, executor, started))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+        close_book(book, filename)
+
+
+class BookHTTPServer(ThreadingHTTPServer):
+    """HTTP server sharing one thread-safe book between its request threads"""
+
+    daemon_threads = True
+
+    def __init__(self, address, book):
+        self.book = book
+        super().__init__(address, BookRequestHandler)
+
+
+class BookRequestHandler(BaseHTTPRequestHandler):
+    """JSON API: GET/DELETE /contacts/<name>, POST /contacts, GET /contacts?prefix=&page=, GET /phones/<phone>,
+    GET /fuzzy?name=&limit=, GET /birthdays?days=&start="""
+
+    # Keep-alive by default, pipelined requests are read one after another from the buffered socket
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, with Nagle a small reply would wait for the client's ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method: str):
+        # The body is always consumed, otherwise it would be parsed as the next pipelined request.
+        # Without a valid length the next request cannot be found, so the connection is closed
+        length = self.headers.get("Content-Length")
+        if length is None and method == "POST":
+            self._send(411, {"error": "Content-Length is required."}, close=True)
+            return
+        length = length or "0"
+        if not (length.isascii() and length.isdigit()):
+            self._send(400, {"error": "Invalid Content-Length."}, close=True)
+            return
+        if int(length) > HTTP_BODY_LIMIT:
+            self._send(413, {"error": f"Body must not exceed {HTTP_BODY_LIMIT} bytes."}, close=True)
+            return
+        body = self.rfile.read(int(length))
+        url = urlsplit(self.path)
+        path = [unquote(part) for part in url.path.strip("/").split("/")]
+        # Handlers raise ValueError only with messages meant for the client
+        try:
+            status, payload = self._route(method, path, parse_qs(url.query), body)
+            # Writes count towards the change bound of checkpoints, like commands of the other front ends
+            if method != "GET" and self.server.book.checkpointer is not None:
+                self.server.book.checkpointer.changed()
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception:
+            status, payload = 500, {"error": "Internal error."}
+        self._send(status, payload)
+
+    # Query parameters, parsed with errors that name the parameter
+    @staticmethod
+    def _text_param(query: dict, name: str, default: str | None = None) -> str:
+        values = query.get(name)
+        if values:
+            return values[0]
+        if default is None:
+            raise ValueError(f"Parameter {name} is required")
+        return default
+
+    @staticmethod
+    def _int_param(query: dict, name: str, default: int) -> int:
+        values = query.get(name)
+        if not values:
+            return default
+        if not (values[0].isascii() and values[0].isdigit()):
+            raise ValueError(f"Parameter {name} must be a whole number")
+        return int(values[0])
+
+    def _route(self, method: str, path: list[str], query: dict, body: bytes):
+        book = self.server.book
+        if path[0] == "contacts" and len(path) == 2 and method in ("GET", "DELETE"):
+            if method == "GET":
+                with book.locked():
+                    record = book.find(path[1])
+                    payload = record.to_dict() if record is not None else None
+                return (200, payload) if payload is not None else (404, {"error": "Contact does not exist."})
+            with book.locked(write=True):
+                deleted = book.delete(path[1])
+            return (204, None) if deleted else (404, {"error": "Contact does not exist."})
+        if path == ["contacts"] and method == "GET":
+            page = self._int_param(query, "page", 1)
+            if page < 1:
+                raise ValueError("Page must be a positive number")
+            with book.locked():
+                records, total = book.search(self._text_param(query, "prefix", ""), page)
+                contacts = [record.to_dict() for record in records]
+            return 200, {"total": total, "page": page, "page_size": SEARCH_PAGE_SIZE, "contacts": contacts}
+        if path == ["contacts"] and method == "POST":
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise ValueError("Body must be a JSON object")
+            record = Record.from_dict(data)
+            with book.locked(write=True):
+                # A name typed in another case replaces the stored contact under its stored spelling
+                existing = book.find(record.name.value)
+                created = existing is None
+                if existing is not None and existing.name.value != record.name.value:
+                    record = Record.from_dict(dict(data, name=existing.name.value))
+                book.add_record(record)
+                payload = record.to_dict()
+            return 201 if created else 200, payload
+        if path[0] == "phones" and len(path) == 2 and method == "GET":
+            with book.locked():
+                owners = [record.to_dict() for record in book.find_by_phone(path[1])]
+            return 200, {"phone": path[1], "contacts": owners}
+        if path == ["fuzzy"] and method == "GET":
+            limit = self._int_param(query, "limit", FUZZY_LIMIT)
+            if not 1 <= limit <= SEARCH_PAGE_SIZE:
+                raise ValueError(f"Limit must be from 1 to {SEARCH_PAGE_SIZE}")
+            with book.locked():
+                matches = [dict(record.to_dict(), similarity=round(similarity, 3))
+                           for similarity, record in book.fuzzy_find(self._text_param(query, "name"), limit)]
+            return 200, matches
+        if path == ["birthdays"] and method == "GET":
+            days = self._int_param(query, "days", UPCOMING_BIRTHDAYS_DAYS)
+            if not 0 <= days <= MAX_BIRTHDAYS_DAYS:
+                raise ValueError(f"Number of days must be from 0 to {MAX_BIRTHDAYS_DAYS}")
+            start = None
+            if "start" in query:
+                try:
+                    start = parse_date(self._text_param(query, "start"))
+                except ValueError:
+                    raise ValueError("Parameter start must be a date DD.MM.YYYY")
+            with book.locked():
+                upcoming = book.get_upcoming_birthdays(start, days)
+            return 200, upcoming
+        return 404, {"error": "Not found."}
+
+    def _send(self, status: int, payload, close: bool = False):
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        if close:
+            self.send_header("Connection", "close")
+        if body:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def http_main(filename: str = DB_FILENAME, host: str = SERVER_HOST, port: int = 0, compact_phones: bool = False,
+              engine: str | None = None, checkpoint_interval: float = CHECKPOINT_INTERVAL):
+    """Share one book between HTTP clients through the JSON API of BookRequestHandler"""
+
+    book = open_shared_book(filename, compact_phones, engine, checkpoint_interval)
+    server = BookHTTPServer((host, port), book)
+    address = server.server_address
+    print(f"Serving {filename} on http://{address[0]}:{address[1]}, press Ctrl+C to stop", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        close_book(book, filename)
+
+
+def main(filename: str = DB_FILENAME, compact_phones: bool = False, engine: str | None = None,
+         checkpoint_interval: float = CHECKPOINT_INTERVAL):
+    book = open_book(filename, compact_phones, engine)
+    checkpointer = start_checkpointer(book, filename, checkpoint_interval)
     print("Welcome to the assistant bot!")
     try:
         while True:
@@ -317,41 +3150,52 @@ def main():
                 print("Invalid command.")
                 continue
 
-            if command in ["close", "exit"]:
+            if command in EXIT_COMMANDS:
                 print("Good bye!")
                 break
 
-            elif command == "hello":
-                print("How can I help you?")
-
-            elif command == "add":
-                print(add_contact(args, book))
-
-            elif command == "change":
-                print(change_contact(args, book))
+            print(dispatch(command, args, book))
 
-            elif command == "phone":
-                print(show_phone(args, book))
-
-            elif command == "all":
-                print(show_all(book))
-
-            elif command == "add-birthday":
-                print(add_birthday(args, book))
-
-            elif command == "show-birthday":
-                print(show_birthday(args, book))
-
-            elif command == "birthdays":
-                print(birthdays(args, book))
-
-            else:
-                print("Invalid command.")
+            if checkpointer is not None:
+                checkpointer.changed()
+            elif book.journal is not None and book.journal.entries >= JOURNAL_COMPACT_EVERY:
+                save_data(book, filename)
     except KeyboardInterrupt:
         print("Error. Exiting...")
     finally:
-        save_data(book)
+        close_book(book, filename)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Address book assistant bot")
+    parser.add_argument("filename", nargs="?", default=DB_FILENAME,
+                        help="address book file, .db/.sqlite/.sqlite3 files use SQLite storage")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="SCRIPT",
+                        help="run commands from SCRIPT (stdin if omitted) without prompting")
+    parser.add_argument("--verbose", action="store_true", help="print the reply of every batch command")
+    parser.add_argument("--compact-phones", action="store_true",
+                        help="store phone numbers as packed integers, about 60 bytes less per contact "
+                             "with two phones")
+    parser.add_argument("--engine", choices=list(ENGINES),
+                        help="layout of a pickled book: columnar suits very large books, "
+                             "lazy loads contacts from a memory-mapped snapshot on first access")
+    parser.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL, metavar="SECONDS",
+                        help="seconds between background snapshots of an interactive session, 0 disables them")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="serve commands over TCP, one command per line, replies end with an empty line")
+    parser.add_argument("--http", type=int, metavar="PORT", help="serve a JSON API over HTTP")
+    parser.add_argument("--host", default=SERVER_HOST, help="address the server listens on")
+    cli_args = parser.parse_args()
+
+    if cli_args.batch:
+        sys.exit(0 if batch_main(cli_args.filename, cli_args.batch, cli_args.verbose,
+                                 cli_args.compact_phones, cli_args.engine) else 1)
+    if cli_args.serve is not None:
+        serve_main(cli_args.filename, cli_args.host, cli_args.serve, cli_args.compact_phones, cli_args.engine,
+                   cli_args.checkpoint_interval)
+        sys.exit(0)
+    if cli_args.http is not None:
+        http_main(cli_args.filename, cli_args.host, cli_args.http, cli_args.compact_phones, cli_args.engine,
+                  cli_args.checkpoint_interval)
+        sys.exit(0)
+    main(cli_args.filename, cli_args.compact_phones, cli_args.engine, cli_args.checkpoint_interval)
@@ -0,0 +1,647 @@
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+import warnings
+from datetime import date, datetime
+
+import benchmark
+import task_01
+
+
+class ParseDateTest(unittest.TestCase):
+    """parse_date accepts and rejects exactly what strptime does with the birthday format"""
+
+    def assert_same_as_strptime(self, value):
+        try:
+            expected = datetime.strptime(value, "%d.%m.%Y").date()
+        except ValueError:
+            expected = ValueError
+        try:
+            actual = task_01.parse_date(value)
+        except ValueError:
+            actual = ValueError
+        self.assertEqual(actual, expected, repr(value))
+
+    def test_structured_inputs(self):
+        days = ["", "0", "1", "01", "9", " 9", "  9", "10", "29", "1\u0663", "3\u0661", "31", "32", "+1", "-1", "001"]
+        months = ["", "0", "1", "01", "02", "12", "13", " 1", "1\u0662", "+2"]
+        years = ["1990", "0001", "0000", "2000", "99", "\u0661\u0669\u0669\u0660", "19901", " 199", "+199"]
+        for day, month, year in itertools.product(days, months, years):
+            self.assert_same_as_strptime(f"{day}.{month}.{year}")
+
+    def test_random_inputs(self):
+        rng = random.Random(16)
+        alphabet = "0123456789..... +-x\u0663\u00b2"
+        for _ in range(30_000):
+            self.assert_same_as_strptime("".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))))
+        for _ in range(30_000):
+            self.assert_same_as_strptime(
+                f"{rng.randint(0, 40):0{rng.randint(1, 2)}d}.{rng.randint(0, 14):0{rng.randint(1, 2)}d}."
+                f"{rng.randint(0, 2100):0{rng.randint(3, 5)}d}")
+
+
+class PhoneIndexTest(unittest.TestCase):
+    """Phones keep their order through edits on either side of PHONE_INDEX_MIN_SIZE"""
+
+    def test_edit_and_remove_keep_order(self):
+        for count in (3, task_01.PHONE_INDEX_MIN_SIZE + 5):
+            with self.subTest(count=count):
+                record = task_01.Record("Alice")
+                numbers = [f"{i:010d}" for i in range(count)]
+                for number in numbers:
+                    record.add_phone(number)
+                record.edit_phone(numbers[1], "0999999999")
+                record.remove_phone(numbers[0])
+                numbers[1] = "0999999999"
+                self.assertEqual([phone.value for phone in record.phones], numbers[1:])
+                self.assertIsNone(record.find_phone(numbers[0]))
+                self.assertEqual(record.find_phone("0999999999").value, "0999999999")
+
+
+    def test_compact_book_finds_phones_by_number(self):
+        book = task_01.AddressBook()
+        task_01.add_contact(["Alice", "0123456789"], book)
+        book.use_compact_phones()
+        task_01.add_contact(["Bob", "0123456789"], book)
+        task_01.add_contact(["Bob", "0123456788"], book)
+        self.assertEqual([record.name.value for record in book.find_by_phone("0123456789")], ["Alice", "Bob"])
+        book.find("Bob").edit_phone("0123456788", "0123456787")
+        self.assertEqual(book.find_by_phone("0123456788"), [])
+        self.assertEqual(book.find_by_phone("0123456787"), [book.find("Bob")])
+        self.assertEqual(book.find_by_phone("12345"), [])
+        self.assertTrue(all(isinstance(number, int) for number in book._phone_owners))
+
+
+class SortedNamesTest(unittest.TestCase):
+    """Blocks split and empty while names come and go, ranks and pages match a sorted list"""
+
+    def assert_matches(self, names, expected):
+        expected = sorted(expected, key=task_01.name_order)
+        self.assertEqual(names.slice(0, len(names)), expected)
+        self.assertEqual(names._maxes, [task_01.name_order(block[-1]) for block in names._blocks])
+        self.assertTrue(all(0 < len(block) <= 2 * names.BLOCK_SIZE for block in names._blocks))
+        for prefix in ("", "a", "B1", "c99", "zzz"):
+            start, end = names.prefix_range(prefix)
+            matching = [name for name in expected if task_01.normalize_name(name).startswith(prefix.lower())]
+            self.assertEqual(names.slice(start, end), matching)
+            self.assertEqual(names.slice(start + 5, min(start + 12, end)), matching[5:12])
+
+    def test_blocks_split_and_empty(self):
+        rng = random.Random(23)
+        expected = [f"{rng.choice('aAbBc')}{i}" for i in range(5 * task_01.SortedNames.BLOCK_SIZE)]
+        rng.shuffle(expected)
+        names = task_01.SortedNames(expected[:10])
+        for name in expected[10:]:
+            names.add(name)
+        self.assertGreater(len(names._blocks), 2)
+        self.assert_matches(names, expected)
+
+        removed = sorted(expected, key=task_01.name_order)[:3 * names.BLOCK_SIZE]
+        for name in removed:
+            names.remove(name)
+        names.remove("missing")
+        self.assertEqual(len(names), len(expected) - len(removed))
+        self.assert_matches(names, set(expected) - set(removed))
+
+
+class ColumnarTest(unittest.TestCase):
+    """The columnar engine answers like the dict engine while rows move and the columns are rebuilt"""
+
+    def assert_same_contacts(self, book, expected):
+        self.assertEqual([str(record) for record in book.values()], [str(record) for record in expected.values()])
+
+    def test_switchboard_contact_keeps_columns_small(self):
+        book, expected = task_01.ColumnarAddressBook(), task_01.AddressBook()
+        for i in range(3000):
+            for target in (book, expected):
+                task_01.add_contact(["Switch", f"{i:010d}"], target)
+                if i % 100 == 0:
+                    task_01.add_contact([f"Other{i}", f"{8_000_000_000 + i:010d}"], target)
+                    task_01.add_birthday([f"Other{i}", "29.02.2000"], target)
+        live = sum(len(record.phones) for record in book.values())
+        self.assertLessEqual(len(book._phone_numbers), max(2 * live, live + book.COMPACT_MIN_DEAD_PHONES))
+
+        for target in (book, expected):
+            target.find("Switch").edit_phone("0000000002", "0999999999")
+            target.find("Switch").remove_phone("0000000001")
+            task_01.add_birthday(["switch", "01.03.1990"], target)
+            target.find("Other100").remove_phone("8000000100")
+        self.assert_same_contacts(book, expected)
+        self.assertEqual(book.find_by_phone("0999999999"), [book.find("Switch")])
+        self.assertEqual(book.find_by_phone("0000000002"), [])
+        self.assertEqual(book.find_by_phone("8000000100"), [])
+
+    def test_deleted_rows_are_compacted(self):
+        book, expected = task_01.ColumnarAddressBook(), task_01.AddressBook()
+        count = 3 * book.COMPACT_MIN_DEAD_ROWS
+        for target in (book, expected):
+            for i in range(count):
+                task_01.add_contact([f"Contact{i}", f"{i % 500:010d}"], target)
+            for i in range(0, count, 3):
+                target.find(f"Contact{i}").add_phone("0999999999")
+            for i in range(count // 2):
+                target.delete(f"Contact{i}")
+        self.assertLess(len(book._names), count + count // 3)
+        self.assert_same_contacts(book, expected)
+        owners = [record.name.value for record in book.find_by_phone("0000000007")]
+        self.assertEqual(owners, [record.name.value for record in expected.find_by_phone("0000000007")])
+
+    @unittest.skipIf(task_01.np is None, "NumPy is not installed")
+    def test_vectorized_birthdays_match_row_scan(self):
+        rng = random.Random(14)
+        book, expected = task_01.ColumnarAddressBook(), task_01.AddressBook()
+        for i in range(2000):
+            birthday = rng.choice(["29.02.2000", "31.12.1990", "01.01.1985", None,
+                                   f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2010)}"])
+            for target in (book, expected):
+                task_01.add_contact([f"Contact{i}", f"{i:010d}"], target)
+                if birthday:
+                    task_01.add_birthday([f"Contact{i}", birthday], target)
+        for start in (date(2023, 12, 20), date(2024, 2, 25), date(2025, 2, 25)):
+            with self.subTest(start=start):
+                with unittest.mock.patch.object(task_01, "VECTORIZED_MIN_ROWS", len(book)):
+                    vectorized = book.get_upcoming_birthdays(start, 366)
+                with unittest.mock.patch.object(task_01, "np", None):
+                    scanned = book.get_upcoming_birthdays(start, 366)
+                self.assertEqual(vectorized, scanned)
+                self.assertEqual(vectorized, expected.get_upcoming_birthdays(start, 366))
+        self.assertEqual(len(book.find_by_phone("0999999999")), len(expected.find_by_phone("0999999999")))
+
+
+class BookFileTest(unittest.TestCase):
+    """Books saved to a pickle in a temporary directory"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.filename = os.path.join(self.tmp.name, task_01.DB_FILENAME)
+
+    def open_book(self, engine=None):
+        book = task_01.open_book(self.filename, engine=engine)
+        self.addCleanup(book.journal.close)
+        return book
+
+
+class RecoveryTest(BookFileTest):
+    """Snapshots and the journal bring a book back after a restart"""
+
+    def test_journal_replayed_after_snapshot(self):
+        for engine in task_01.ENGINES:
+            with self.subTest(engine=engine):
+                for name in os.listdir(self.tmp.name):
+                    os.remove(os.path.join(self.tmp.name, name))
+                book = self.open_book(engine)
+                task_01.add_contact(["Alice", "0123456789"], book)
+                task_01.add_contact(["Carol", "0123456787"], book)
+                task_01.save_data(book, self.filename)
+                task_01.add_contact(["Bob", "0123456788"], book)
+                task_01.add_birthday(["Alice", "01.02.1990"], book)
+                book.delete("Carol")
+                book.journal.close()
+
+                book = self.open_book()
+                self.assertIsInstance(book, task_01.ENGINES[engine])
+                self.assertEqual(sorted(book), ["Alice", "Bob"])
+                self.assertEqual(book.find("Alice").birthday_to_string(), "01.02.1990")
+                self.assertEqual(book.find("Bob").find_phone("0123456788").value, "0123456788")
+
+    def test_damaged_snapshot_falls_back_without_replaying_past_gap(self):
+        book = self.open_book()
+        task_01.add_contact(["Alice", "0123456789"], book)
+        task_01.save_data(book, self.filename)
+        task_01.add_contact(["Bob", "0123456788"], book)
+        task_01.save_data(book, self.filename)
+        task_01.add_contact(["Bob", "0123456787"], book)
+        book.journal.close()
+        with open(self.filename, "r+b") as f:
+            f.truncate(10)
+
+        with self.assertWarns(RuntimeWarning):
+            book = self.open_book()
+        self.assertEqual(list(book), ["Alice"])
+        kept = self.filename + task_01.JOURNAL_SUFFIX + task_01.JOURNAL_UNREPLAYED_SUFFIX
+        self.assertEqual(list(task_01.Journal.read(kept)), [[5, "add_phone", "Bob", "0123456787"]])
+
+        # Changes made after the fallback are journaled and replayed as usual
+        task_01.add_contact(["Carol", "0123456786"], book)
+        book.journal.close()
+        with self.assertWarnsRegex(RuntimeWarning, "is damaged"):
+            self.assertEqual(sorted(self.open_book()), ["Alice", "Carol"])
+
+
+    def test_skipped_generation_warns_without_journal(self):
+        book = self.open_book()
+        task_01.add_contact(["Alice", "0123456789"], book)
+        task_01.save_data(book, self.filename)
+        task_01.add_contact(["Bob", "0123456788"], book)
+        task_01.save_data(book, self.filename)
+        book.journal.close()
+        with open(self.filename, "r+b") as f:
+            f.truncate(10)
+
+        with self.assertWarnsRegex(RuntimeWarning, "is damaged"):
+            book = task_01.load_data(self.filename)
+        self.assertEqual(list(book), ["Alice"])
+
+    def test_damaged_bytes_fall_back_to_older_generation(self):
+        for engine in ("dict", "lazy"):
+            with self.subTest(engine=engine):
+                for name in os.listdir(self.tmp.name):
+                    os.remove(os.path.join(self.tmp.name, name))
+                book = self.open_book(engine)
+                for i in range(30):
+                    task_01.add_contact([f"Contact{i}", f"{i:010d}"], book)
+                task_01.save_data(book, self.filename, force=True)
+                task_01.save_data(book, self.filename, force=True)
+                book.journal.close()
+                with open(self.filename, "rb") as f:
+                    data = f.read()
+
+                for position in range(0, len(data), 7):
+                    damaged = bytearray(data)
+                    damaged[position] ^= 0xFF
+                    with open(self.filename, "wb") as f:
+                        f.write(damaged)
+                    with warnings.catch_warnings(record=True) as caught:
+                        warnings.simplefilter("always")
+                        loaded = task_01.load_snapshot(self.filename)
+                    if engine == "lazy" or caught:
+                        # A changed pickle may still load, a lazy snapshot never loads partially
+                        self.assertEqual(len(caught), 1, position)
+                        self.assertEqual(len(loaded), 30, position)
+                    if isinstance(loaded, task_01.LazyAddressBook):
+                        loaded._snapshot.close()
+
+
+    def test_lazy_snapshot_is_not_mapped_while_files_move(self):
+        book = self.open_book("lazy")
+        for i in range(10):
+            task_01.add_contact([f"Contact{i}", f"{i:010d}"], book)
+        task_01.save_data(book, self.filename)
+        book.journal.close()
+        book = self.open_book()
+        task_01.add_birthday(["Contact1", "01.02.1990"], book)
+        mapped = book._snapshot
+        replace = os.replace
+
+        def replace_unmapped(src, dst):
+            self.assertTrue(mapped._map.closed)
+            replace(src, dst)
+
+        with unittest.mock.patch("os.replace", replace_unmapped):
+            self.assertTrue(task_01.save_data(book, self.filename))
+        self.assertIsNot(book._snapshot, mapped)
+        self.assertEqual(book.find("Contact7").find_phone("0000000007").value, "0000000007")
+        self.assertEqual(book.find("Contact1").birthday_to_string(), "01.02.1990")
+        book._snapshot.close()
+
+
+    def test_compact_phones_dirty_only_when_persisted(self):
+        for engine, dirty in (("dict", True), ("lazy", False)):
+            with self.subTest(engine=engine):
+                for name in os.listdir(self.tmp.name):
+                    os.remove(os.path.join(self.tmp.name, name))
+                book = self.open_book(engine)
+                task_01.add_contact(["Alice", "0123456789"], book)
+                task_01.save_data(book, self.filename)
+                book.journal.close()
+
+                book = task_01.open_book(self.filename, compact_phones=True)
+                self.addCleanup(book.journal.close)
+                self.assertEqual(book.find("Alice").find_phone("0123456789").value, "0123456789")
+                self.assertEqual(book.dirty, dirty)
+                self.assertEqual(task_01.save_data(book, self.filename), dirty)
+                self.assertEqual(os.path.exists(self.filename + ".1"), dirty)
+
+
+class CheckpointTest(BookFileTest):
+    """Background checkpoints write the book as it was when they started"""
+
+    def test_changes_during_checkpoint_are_left_to_the_journal(self):
+        for engine in ("dict", "columnar", "lazy"):
+            with self.subTest(engine=engine):
+                for name in os.listdir(self.tmp.name):
+                    os.remove(os.path.join(self.tmp.name, name))
+                book = self.open_book(engine)
+                task_01.add_contact(["Alice", "0123456789"], book)
+                task_01.add_contact(["Bob", "0123456787"], book)
+                # Lazy books read unchanged records from the mapped snapshot
+                task_01.save_data(book, self.filename, force=True)
+                book.journal.close()
+                book = self.open_book(engine)
+                task_01.add_birthday(["Bob", "01.02.1990"], book)
+
+                snapshot_writer = book._snapshot_writer
+
+                def writer_changing_book():
+                    write = snapshot_writer()
+
+                    def write_after_changes(f):
+                        task_01.add_contact(["Alice", "0123456788"], book)
+                        task_01.add_birthday(["Bob", "02.02.1990"], book)
+                        book.delete("Bob")
+                        write(f)
+                    return write_after_changes
+
+                book._snapshot_writer = writer_changing_book
+                self.assertTrue(task_01.Checkpointer(book, self.filename).checkpoint())
+                book.journal.close()
+
+                snapshot = task_01.load_snapshot(self.filename)
+                self.assertEqual(snapshot.find("Alice").phones[-1].value, "0123456789")
+                self.assertEqual(snapshot.find("Bob").birthday_to_string(), "01.02.1990")
+                reopened = self.open_book()
+                self.assertEqual(str(reopened.find("Alice")),
+                                 "Contact name: Alice, phones: 0123456789; 0123456788, birthday: -")
+                self.assertIsNone(reopened.find("Bob"))
+
+    def test_failed_checkpoint_keeps_thread_running(self):
+        book = self.open_book()
+        task_01.add_contact(["Alice", "0123456789"], book)
+        snapshot_writer = book._snapshot_writer
+        failures = []
+
+        def failing_once():
+            if not failures:
+                failures.append(True)
+                raise RuntimeError("serializer failed")
+            return snapshot_writer()
+
+        book._snapshot_writer = failing_once
+        checkpointer = task_01.Checkpointer(book, self.filename, interval=0.01).start()
+        self.addCleanup(checkpointer.stop)
+        deadline = time.monotonic() + 5
+        while not checkpointer.checkpoints and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(checkpointer.running)
+        self.assertEqual(checkpointer.checkpoints, 1)
+        self.assertEqual(failures, [True])
+
+
+class BatchTest(BookFileTest):
+    """A command script runs without the prompt, is saved once and reports what failed"""
+
+    SCRIPT = (
+        "# contacts\n"
+        "add Alice 0123456789\n"
+        "\n"
+        "add-birthday Alice 01.02.1990\n"
+        "change Alice 0000000000 0123456788\n"
+        "add Bob 0123456787\n"
+    )
+
+    def run_script(self, script, **kwargs):
+        script_file = os.path.join(self.tmp.name, "script.txt")
+        with open(script_file, "w", encoding="utf-8") as f:
+            f.write(script)
+        with unittest.mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+                unittest.mock.patch.object(task_01.Journal, "append") as append:
+            ok = task_01.batch_main(self.filename, script_file, **kwargs)
+        append.assert_not_called()
+        return ok, stdout.getvalue().splitlines()
+
+    def test_script_is_saved_with_a_summary(self):
+        ok, output = self.run_script(self.SCRIPT)
+        self.assertFalse(ok)
+        self.assertEqual(output, ["Batch finished: 3 succeeded, 1 failed."])
+        book = self.open_book()
+        self.assertEqual(sorted(book), ["Alice", "Bob"])
+        self.assertEqual(book.find("Alice").birthday_to_string(), "01.02.1990")
+        self.assertFalse(book.dirty)
+
+    def test_verbose_lists_replies_by_line_and_exit_ends_the_script(self):
+        ok, output = self.run_script("add Alice 0123456789\nexit\nadd Bob 0123456787\n", verbose=True)
+        self.assertTrue(ok)
+        self.assertEqual(len(output), 2)
+        self.assertTrue(output[0].startswith("1: "))
+        self.assertEqual(output[1], "Batch finished: 1 succeeded, 0 failed.")
+        self.assertEqual(sorted(self.open_book()), ["Alice"])
+
+    def test_sqlite_script_is_committed(self):
+        self.filename = os.path.join(self.tmp.name, "contacts.db")
+        ok, output = self.run_script(self.SCRIPT)
+        self.assertFalse(ok)
+        self.assertEqual(output, ["Batch finished: 3 succeeded, 1 failed."])
+        book = task_01.SQLiteAddressBook(self.filename)
+        self.addCleanup(book.close)
+        self.assertEqual(sorted(book), ["Alice", "Bob"])
+
+
+class ServerTest(unittest.TestCase):
+    """Network clients share the book but not the files of the host"""
+
+    def test_file_commands_are_refused_to_network_clients(self):
+        book = task_01.AddressBook().use_locking()
+        task_01.add_contact(["Alice", "0123456789"], book)
+
+        async def session(lines):
+            started = asyncio.get_running_loop().create_future()
+            server = asyncio.create_task(task_01.serve(book, port=0, started=started.set_result))
+            port = (await started).sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection(task_01.SERVER_HOST, port)
+            replies = []
+            for line in lines:
+                writer.write(line.encode() + b"\n")
+                replies.append((await reader.readuntil(b"\n\n")).decode().strip())
+            writer.close()
+            server.cancel()
+            return replies
+
+        with tempfile.TemporaryDirectory() as workdir:
+            target = os.path.join(workdir, "contacts.csv")
+            replies = asyncio.run(session([f"export-csv {target}", f"import-csv {target}", "phone alice"]))
+            self.assertFalse(os.path.exists(target))
+        self.assertEqual(replies, [
+            "Error: export-csv is not available over the network.",
+            "Error: import-csv is not available over the network.",
+            "Alice: 0123456789",
+        ])
+
+
+class NameCaseTest(unittest.TestCase):
+    """Names typed in another case reach the stored contact in every engine"""
+
+    def test_search_and_delete_ignore_case(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            for engine in (*task_01.ENGINES, "sqlite"):
+                with self.subTest(engine=engine):
+                    if engine == "sqlite":
+                        book = task_01.SQLiteAddressBook(os.path.join(workdir, "contacts.db"))
+                        self.addCleanup(book.close)
+                    else:
+                        book = task_01.ENGINES[engine]()
+                    for name in ("alex", "Alice", "Bob"):
+                        task_01.add_contact([name, "0123456789"], book)
+                    records, total = book.search("ALE")
+                    self.assertEqual(([record.name.value for record in records], total), (["alex"], 1))
+                    self.assertEqual([record.name.value for record in book.search("a")[0]], ["alex", "Alice"])
+                    self.assertTrue(book.delete("ALICE"))
+                    self.assertIsNone(book.find("Alice"))
+                    self.assertFalse(book.delete("alice"))
+
+
+class CSVTest(unittest.TestCase):
+    """CSV import merges rows into the book and export writes them back"""
+
+    ROWS = ("name,phones,birthday\n"
+            "Alice,0123456789,01.02.1990\n"
+            "Dup,0111111111;0111111111,\n"
+            "alice,0123456788;0123456788;0123456789,\n"
+            "Broken,12345,\n"
+            "\n"
+            "Bob,,31.12.1985\n")
+
+    def test_import_merges_and_export_round_trips(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            source = os.path.join(workdir, "in.csv")
+            with open(source, "w", encoding="utf-8") as f:
+                f.write(self.ROWS)
+            for engine in (*task_01.ENGINES, "sqlite"):
+                with self.subTest(engine=engine):
+                    if engine == "sqlite":
+                        book = task_01.SQLiteAddressBook(os.path.join(workdir, "contacts.db"))
+                        self.addCleanup(book.close)
+                    else:
+                        book = task_01.ENGINES[engine]()
+                    self.assertEqual(book.import_csv(source, batch_size=2), (4, 1))
+                    self.assertEqual(str(book.find("Alice")),
+                                     "Contact name: Alice, phones: 0123456789; 0123456788, birthday: 01.02.1990")
+                    self.assertEqual(str(book.find("Dup")), "Contact name: Dup, phones: 0111111111, birthday: -")
+
+                    target = os.path.join(workdir, f"{engine}.csv")
+                    self.assertEqual(book.export_csv(target), 3)
+                    copy = task_01.AddressBook()
+                    self.assertEqual(copy.import_csv(target), (3, 0))
+                    self.assertEqual(sorted(map(str, copy.values())), sorted(map(str, book.values())))
+
+
+class HTTPTest(unittest.TestCase):
+    """Malformed requests get an explicit error and leave the server running"""
+
+    def setUp(self):
+        book = task_01.AddressBook().use_locking()
+        task_01.add_contact(["Alice", "0123456789"], book)
+        self.server = task_01.BookHTTPServer(("127.0.0.1", 0), book)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def request(self, raw: bytes):
+        with socket.create_connection(self.server.server_address) as conn:
+            conn.sendall(raw)
+            reply = conn.makefile("rb")
+            status = int(reply.readline().split()[1])
+            headers = {}
+            while (line := reply.readline().strip()):
+                key, value = line.decode().split(":", 1)
+                headers[key.lower()] = value.strip()
+            body = reply.read(int(headers.get("content-length", 0)))
+            return status, json.loads(body) if body else None
+
+    def get(self, path: str):
+        return self.request(f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode())
+
+    def post(self, path: str, payload):
+        body = json.dumps(payload).encode()
+        return self.request(b"POST %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (path.encode(), len(body), body))
+
+    def test_contact_names_ignore_case(self):
+        self.assertEqual(self.post("/contacts", {"name": "ALICE", "phones": ["0123456788"]}),
+                         (200, {"name": "Alice", "phones": ["0123456788"], "birthday": None}))
+        self.assertEqual(self.get("/contacts")[1]["total"], 1)
+        self.assertEqual(self.request(b"DELETE /contacts/ALICE HTTP/1.1\r\n\r\n")[0], 204)
+        self.assertEqual(self.get("/contacts/alice")[0], 404)
+
+    def test_writes_wake_the_checkpointer(self):
+        self.server.book.mark_saved()
+        with tempfile.TemporaryDirectory() as workdir:
+            checkpointer = task_01.Checkpointer(self.server.book, os.path.join(workdir, task_01.DB_FILENAME),
+                                                interval=3600, every=2).start()
+            self.addCleanup(checkpointer.stop)
+            self.assertEqual(self.post("/contacts", {"name": "Bob"})[0], 201)
+            self.assertEqual(self.request(b"DELETE /contacts/Bob HTTP/1.1\r\n\r\n")[0], 204)
+            deadline = time.monotonic() + 5
+            while not checkpointer.checkpoints and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(checkpointer.checkpoints, 1)
+
+    def test_bad_content_length_is_rejected(self):
+        self.assertEqual(self.request(b"POST /contacts HTTP/1.1\r\nContent-Length: abc\r\n\r\n"),
+                         (400, {"error": "Invalid Content-Length."}))
+        self.assertEqual(self.request(b"POST /contacts HTTP/1.1\r\nContent-Length: -1\r\n\r\n"),
+                         (400, {"error": "Invalid Content-Length."}))
+        self.assertEqual(self.request(b"POST /contacts HTTP/1.1\r\n\r\n"),
+                         (411, {"error": "Content-Length is required."}))
+        self.assertEqual(self.get("/contacts/Alice")[0], 200)
+
+    def test_bad_parameters_are_named_in_the_error(self):
+        self.assertEqual(self.get("/contacts?page=x"), (400, {"error": "Parameter page must be a whole number"}))
+        self.assertEqual(self.get("/fuzzy"), (400, {"error": "Parameter name is required"}))
+        self.assertEqual(self.get("/birthdays?start=soon"),
+                         (400, {"error": "Parameter start must be a date DD.MM.YYYY"}))
+        body = b'{"name": "Bob", "phones": "0123456788"}'
+        self.assertEqual(
+            self.request(b"POST /contacts HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)),
+            (400, {"error": "Field phones must be a list of strings"}))
+
+
+class LockingStressTest(unittest.TestCase):
+    """The locking stress check of the benchmark, with fewer commands per thread, and direct calls from threads"""
+
+    def test_indexes_stay_consistent_under_concurrent_commands(self):
+        args = argparse.Namespace(threads=benchmark.DEFAULT_THREADS, ops=500, seed=0)
+        with tempfile.TemporaryDirectory() as workdir:
+            for engine in (*task_01.ENGINES, "sqlite"):
+                with self.subTest(engine=engine):
+                    result = benchmark.stress_locking(engine, args, workdir)
+                    self.assertEqual(result["invariant_errors"], [])
+
+    def test_direct_calls_take_the_lock(self):
+        # A bulk importer and editors calling the book itself, without commands wrapping them in book.locked()
+        threads, contacts = 4, 200
+        with tempfile.TemporaryDirectory() as workdir:
+            csv_file = os.path.join(workdir, "import.csv")
+            with open(csv_file, "w", encoding="utf-8") as f:
+                f.writelines(f"Imported {i},{9000000000 + i},01.02.1990\n" for i in range(contacts))
+            for engine in (*task_01.ENGINES, "sqlite"):
+                with self.subTest(engine=engine):
+                    book = (task_01.SQLiteAddressBook(os.path.join(workdir, "direct.db")) if engine == "sqlite"
+                            else task_01.ENGINES[engine]()).use_locking()
+
+                    def edit(thread: int):
+                        for i in range(contacts):
+                            record = task_01.Record(f"Thread {thread} {i}")
+                            record.add_phone(f"{thread}{i:09d}")
+                            book.add_record(record)
+                            book.find(record.name.value).edit_phone(f"{thread}{i:09d}", f"{thread}{i + 1:09d}")
+                            book.find(record.name.value).add_birthday("03.04.1985")
+                            if i % 2:
+                                book.delete(record.name.value)
+
+                    workers = [threading.Thread(target=edit, args=(thread,)) for thread in range(1, threads + 1)]
+                    workers.append(threading.Thread(target=book.import_csv, args=(csv_file, 16)))
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+
+                    self.assertEqual(len(book), contacts + threads * contacts // 2)
+                    self.assertEqual(benchmark.check_invariants(book), [])
+                    self.assertEqual([record.name.value for record in book.find_by_phone("1000000001")],
+                                     ["Thread 1 0"])
+                    if engine == "sqlite":
+                        book.close()
+
+
+if __name__ == "__main__":
+    unittest.main()